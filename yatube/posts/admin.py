@@ -1,9 +1,114 @@
+from django import forms
 from django.contrib import admin
+from django.contrib.admin.views.main import ORDER_VAR, ChangeList
+from django.core.paginator import Paginator
+from django.forms.utils import flatatt
+from django.utils.functional import cached_property
+from django.utils.html import format_html, format_html_join
 
+from . import feed_cache, search
 from .models import Group, Post, Comment
+from .utils import CURSOR_PARAM, CursorPaginator
 
+# Сколько строк в худшем случае считает пагинатор админки: дальше
+# страницы по номеру не нумеруются, к старым записям ведут курсор,
+# фильтры и поиск.
+COUNT_LIMIT = 10000
 
-class PostAdmin(admin.ModelAdmin):
+
+class BoundedCountPaginator(Paginator):
+    """Пагинатор без полного COUNT(*): считает не больше COUNT_LIMIT."""
+
+    @cached_property
+    def count(self):
+        return self.object_list[:COUNT_LIMIT].count()
+
+
+class PlainSelect(forms.Select):
+    """Select, который собирает option без шаблона на каждый из них.
+
+    В list_editable это сотни списков по десятку групп, и рендер
+    шаблона каждого option занимал большую часть времени страницы.
+    """
+
+    def render(self, name, value, attrs=None, renderer=None):
+        value = '' if value is None else str(value)
+        options = format_html_join('', '<option value="{}"{}>{}</option>', (
+            (option, ' selected' if str(option) == value else '', label)
+            for option, label in self.choices
+        ))
+        return format_html(
+            '<select name="{}"{}>{}</select>',
+            name, flatatt(self.build_attrs(self.attrs, attrs)), options
+        )
+
+
+class CursorChangeList(ChangeList):
+    """Список админки, который листается по ключу cursor_keys.
+
+    Пока список не отсортирован по другой колонке, страницы читаются
+    по индексу без OFFSET и без подсчёта строк; с сортировкой работает
+    обычная нумерация страниц с ограниченным подсчётом.
+    """
+    cursor_paging = False
+    first_page_url = previous_page_url = next_page_url = None
+
+    def __init__(self, request, *args, **kwargs):
+        super().__init__(request, *args, **kwargs)
+        # Ссылки фильтров и сортировки начинают список с начала.
+        self.params.pop(CURSOR_PARAM, None)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_PARAM, None)
+        return lookup_params
+
+    def get_results(self, request):
+        if ORDER_VAR in self.params:
+            return super().get_results(request)
+        keys = self.model_admin.cursor_keys
+        paginator = CursorPaginator(
+            self.queryset, self.list_per_page, keys=keys)
+        page = paginator.get_cursor_page(request.GET.get(CURSOR_PARAM))
+        # Формсет list_editable ждёт queryset, а не список объектов.
+        self.result_list = self.queryset.filter(
+            pk__in=[obj.pk for obj in page]
+        ).order_by(*(f'-{key}' for key in keys))
+        self.result_count = len(page)
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = False
+        self.multi_page = page.has_next() or page.has_previous()
+        self.paginator = paginator
+        self.cursor_paging = True
+        if page.has_previous():
+            self.first_page_url = self.get_query_string(
+                remove=[CURSOR_PARAM])
+            self.previous_page_url = self.get_query_string(
+                {CURSOR_PARAM: page.previous_cursor})
+        if page.has_next():
+            self.next_page_url = self.get_query_string(
+                {CURSOR_PARAM: page.next_cursor})
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Админка больших таблиц: курсорные страницы, поиск по FTS5."""
+    cursor_keys = None
+    paginator = BoundedCountPaginator
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return CursorChangeList
+
+    def get_search_results(self, request, queryset, search_term):
+        """Поиск по полнотекстовому индексу вместо LIKE '%...%'."""
+        if not search.match_expression(search_term):
+            return queryset, False
+        return search.filter_matching(queryset, search_term), False
+
+
+class PostAdmin(LargeTableAdmin):
     list_display = (
         'pub_date',
         'pk',
@@ -13,16 +118,52 @@ class PostAdmin(admin.ModelAdmin):
     )
     list_filter = ('pub_date',)
     list_editable = ('group',)
+    list_select_related = ('author', 'group')
+    raw_id_fields = ('author',)
     search_fields = ('text',)
+    cursor_keys = ('pub_date', 'id')
     empty_value_display = '-пусто-'
 
+    def formfield_for_foreignkey(self, db_field, request, **kwargs):
+        if db_field.name == 'group':
+            kwargs['widget'] = PlainSelect
+        field = super().formfield_for_foreignkey(db_field, request, **kwargs)
+        if db_field.name == 'group':
+            # Без этого список групп list_editable читается для каждой
+            # строки страницы отдельным запросом. iter() — чтобы list()
+            # не спрашивал len() и не делал лишний COUNT(*).
+            if not hasattr(request, 'group_choices'):
+                request.group_choices = list(iter(field.choices))
+            field.choices = request.group_choices
+        return field
+
 
-class CommentAdmin(admin.ModelAdmin):
+class CommentAdmin(LargeTableAdmin):
     list_display = ('pk', 'post', 'author', 'text')
+    list_select_related = ('post', 'author')
+    raw_id_fields = ('post', 'author')
     search_fields = ('text',)
-    list_filter = ('author',)
+    list_filter = ('created',)
+    cursor_keys = ('created', 'id')
     empty_value_display = '-пусто-'
 
+    def delete_model(self, request, obj):
+        self.delete_queryset(request, Comment.objects.filter(pk=obj.pk))
+
+    def delete_queryset(self, request, queryset):
+        """Удаляет комментарии вместе с их строками в поиске.
+
+        Приёмников удаления у Comment нет (см. posts.signals), поэтому
+        индекс и версии постов обновляются здесь.
+        """
+        rows = list(queryset.values_list('id', 'post_id'))
+        queryset.delete()
+        search.remove(Comment, [pk for pk, _ in rows])
+        feed_cache.after_commit(feed_cache.bump_versions, [
+            feed_cache.post_feed(post_id)
+            for post_id in {post_id for _, post_id in rows}
+        ])
+
 
 admin.site.register(Group)
 admin.site.register(Post, PostAdmin)
@@ -0,0 +1,297 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.http import Http404, JsonResponse
+from django.shortcuts import get_object_or_404
+
+from . import feed_cache
+from .conditional import conditional_page, not_modified
+from .models import Comment, Follow, Group, Post, User
+from .utils import (
+    CURSOR_PARAM, MAX_CURSOR_PK, POST_LIMIT, CommentPaginator,
+    CursorPaginator
+)
+
+VERSION = 'v1'
+FIELDS_PARAM = 'fields'
+FOLLOW_LIMIT = 50
+SERIALIZED_KEY = 'posts:api:post:{pk}:{version}:{fields}'
+
+
+def _isoformat(value):
+    return value.isoformat()
+
+
+def _media_url(name):
+    return default_storage.url(name) if name else None
+
+
+# Поля ресурсов: имя в ответе → (колонка values(), преобразование).
+# id отдаётся всегда, остальное — по ?fields=, и в SELECT попадают
+# только колонки запрошенных полей.
+POST_FIELDS = {
+    'id': ('id', None),
+    'text': ('text', None),
+    'pub_date': ('pub_date', _isoformat),
+    'author': ('author__username', None),
+    'group': ('group__slug', None),
+    'image': ('image', _media_url),
+}
+# Имя автора и slug группы меняются без правки поста (а группа
+# удаляется через SET_NULL без сигналов), поэтому в кэш представления
+# поста они не попадают и читаются вместе со страницей.
+POST_RELATED = ('author', 'group')
+COMMENT_FIELDS = {
+    'id': ('id', None),
+    'post': ('post_id', None),
+    'text': ('text', None),
+    'created': ('created', _isoformat),
+    'author': ('author__username', None),
+}
+GROUP_FIELDS = {
+    'id': ('id', None),
+    'slug': ('slug', None),
+    'title': ('title', None),
+    'description': ('description', None),
+}
+FOLLOW_FIELDS = {
+    'id': ('id', None),
+    'user': ('user__username', None),
+    'author': ('author__username', None),
+}
+
+
+def requested_fields(request, available):
+    """Поля из ?fields=a,b; ValueError для неизвестных."""
+    value = request.GET.get(FIELDS_PARAM)
+    if not value:
+        return list(available)
+    names = ['id'] + [
+        name for name in dict.fromkeys(value.split(',')) if name != 'id'
+    ]
+    unknown = set(names) - set(available)
+    if unknown:
+        raise ValueError(
+            f'Неизвестные поля: {", ".join(sorted(unknown))}.')
+    return names
+
+
+def columns(available, names, *extra):
+    """Колонки SELECT для полей names и служебных колонок extra."""
+    return list(dict.fromkeys(
+        [*extra, *(available[name][0] for name in names)]))
+
+
+def serialize(row, available, names):
+    """Строка values() как словарь ответа."""
+    result = {}
+    for name in names:
+        column, convert = available[name]
+        value = row[column]
+        if convert is not None and value is not None:
+            value = convert(value)
+        result[name] = value
+    return result
+
+
+def page_url(request, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    params[CURSOR_PARAM] = cursor
+    return request.build_absolute_uri(f'{request.path}?{params.urlencode()}')
+
+
+def serialized_posts(rows, names):
+    """Посты в представлении API по строкам values() с их id.
+
+    Собственные поля поста берутся из кэша по версии страницы поста и
+    набору полей, поэтому правка поста или новый комментарий сразу
+    делают запись устаревшей; за недостающими постами идёт один запрос
+    только нужных колонок. Поля POST_RELATED берутся из самих строк.
+    """
+    own = [name for name in names if name not in POST_RELATED]
+    related = [name for name in names if name in POST_RELATED]
+    ids = [row['id'] for row in rows]
+    versions = feed_cache.get_version_map(
+        *(feed_cache.post_feed(pk) for pk in ids))
+    fieldset = ','.join(own)
+    keys = {
+        SERIALIZED_KEY.format(
+            pk=pk, version=versions[feed_cache.post_feed(pk)],
+            fields=fieldset
+        ): pk
+        for pk in ids
+    }
+    found = {keys[key]: value for key, value in cache.get_many(
+        list(keys)).items()}
+    missing = [pk for pk in ids if pk not in found]
+    if missing:
+        built = {
+            row['id']: serialize(row, POST_FIELDS, own)
+            for row in Post.objects.filter(id__in=missing).values(
+                *columns(POST_FIELDS, own))
+        }
+        cache.set_many({
+            key: built[pk] for key, pk in keys.items() if pk in built
+        }, settings.POSTS_FEED_CACHE_TIMEOUT)
+        found.update(built)
+    result = []
+    for row in rows:
+        if row['id'] in found:
+            post = {**found[row['id']], **serialize(row, POST_FIELDS, related)}
+            result.append({name: post[name] for name in names})
+    return result
+
+
+def posts_not_modified(request, names, *feeds):
+    """not_modified() для ответа с полями names постов.
+
+    Версии постов и лент не сдвигаются, когда переименовывают автора
+    или группу, поэтому ответ с полями POST_RELATED по ним не проверить:
+    он идёт без ETag и всегда целиком.
+    """
+    if any(name in POST_RELATED for name in names):
+        return None
+    return not_modified(request, *feeds)
+
+
+def post_page(request, posts, *feeds):
+    """Ответ страницы ленты: курсорная страница id и кэш представлений."""
+    try:
+        names = requested_fields(request, POST_FIELDS)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    response = posts_not_modified(request, names, *feeds)
+    if response is not None:
+        return response
+    related = [name for name in names if name in POST_RELATED]
+    page = CursorPaginator(
+        posts.values(*columns(POST_FIELDS, related, 'id', 'pub_date')),
+        POST_LIMIT
+    ).get_cursor_page(request.GET.get(CURSOR_PARAM))
+    return JsonResponse({
+        'results': serialized_posts(list(page), names),
+        'next': page_url(request, page.next_cursor),
+    })
+
+
+@conditional_page
+def post_list(request):
+    return post_page(request, Post.objects.all(), feed_cache.INDEX_FEED)
+
+
+@conditional_page
+def group_post_list(request, slug):
+    group = get_object_or_404(Group.objects.only('id'), slug=slug)
+    return post_page(
+        request, Post.objects.filter(group=group),
+        feed_cache.group_feed(group.id)
+    )
+
+
+@conditional_page
+def profile_post_list(request, username):
+    author = get_object_or_404(User.objects.only('id'), username=username)
+    return post_page(
+        request, Post.objects.filter(author=author),
+        feed_cache.profile_feed(author.id)
+    )
+
+
+@conditional_page
+def post_item(request, post_id):
+    try:
+        names = requested_fields(request, POST_FIELDS)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    response = posts_not_modified(
+        request, names, feed_cache.post_feed(post_id))
+    if response is not None:
+        return response
+    if any(name in POST_RELATED for name in names):
+        # Строку всё равно читать, так что кэш тут лишний.
+        row = Post.objects.filter(id=post_id).values(
+            *columns(POST_FIELDS, names)).first()
+        posts = [serialize(row, POST_FIELDS, names)] if row else []
+    else:
+        posts = serialized_posts([{'id': post_id}], names)
+    if not posts:
+        raise Http404
+    return JsonResponse(posts[0])
+
+
+@conditional_page
+def comment_list(request, post_id):
+    response = not_modified(request, feed_cache.post_feed(post_id))
+    if response is not None:
+        return response
+    try:
+        names = requested_fields(request, COMMENT_FIELDS)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    page = CommentPaginator(
+        Comment.objects.filter(post_id=post_id).values(
+            *columns(COMMENT_FIELDS, names, 'created'))
+    ).get_cursor_page(request.GET.get(CURSOR_PARAM))
+    if not page and not Post.objects.filter(id=post_id).exists():
+        raise Http404
+    return JsonResponse({
+        'results': [
+            serialize(row, COMMENT_FIELDS, names) for row in page
+        ],
+        'next': page_url(request, page.next_cursor),
+    })
+
+
+def group_list(request):
+    """Все группы: их немного, страниц нет."""
+    try:
+        names = requested_fields(request, GROUP_FIELDS)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    rows = Group.objects.order_by('id').values(*columns(GROUP_FIELDS, names))
+    return JsonResponse({
+        'results': [serialize(row, GROUP_FIELDS, names) for row in rows],
+        'next': None,
+    })
+
+
+def follow_page(request, username, side, other):
+    """Подписки пользователя по стороне side, от меньшего id other.
+
+    Курсор — id пользователя на другой стороне: страница идёт прямо
+    по индексу (side, other) без сортировки.
+    """
+    user = get_object_or_404(User.objects.only('id'), username=username)
+    try:
+        names = requested_fields(request, FOLLOW_FIELDS)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    after = request.GET.get(CURSOR_PARAM, '0')
+    # str.isdigit() пропускает и «²», и цифры других алфавитов.
+    if not (after.isascii() and after.isdigit()) or (
+            int(after) > MAX_CURSOR_PK):
+        return JsonResponse({'error': 'Неверный курсор.'}, status=400)
+    rows = list(
+        Follow.objects.filter(**{side: user, f'{other}_id__gt': int(after)})
+        .order_by(f'{other}_id')
+        .values(*columns(FOLLOW_FIELDS, names, f'{other}_id'))
+        [:FOLLOW_LIMIT + 1]
+    )
+    next_url = None
+    if len(rows) > FOLLOW_LIMIT:
+        rows = rows[:FOLLOW_LIMIT]
+        next_url = page_url(request, str(rows[-1][f'{other}_id']))
+    return JsonResponse({
+        'results': [serialize(row, FOLLOW_FIELDS, names) for row in rows],
+        'next': next_url,
+    })
+
+
+def following_list(request, username):
+    return follow_page(request, username, 'user', 'author')
+
+
+def follower_list(request, username):
+    return follow_page(request, username, 'author', 'user')
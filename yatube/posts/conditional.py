@@ -0,0 +1,67 @@
+import hashlib
+from functools import wraps
+
+from django.utils.cache import (
+    get_conditional_response, patch_cache_control, patch_vary_headers
+)
+from django.utils.http import http_date
+
+from . import feed_cache
+
+VALIDATED = (200, 304)
+
+
+def validators(feeds, viewer='anon'):
+    """Слабый ETag и время изменения (timestamp) по версиям лент."""
+    etag = f'W/"{viewer}-{feed_cache.get_versions(*feeds)}"'
+    return etag, int(feed_cache.last_modified(*feeds))
+
+
+def _session_tag(request):
+    """Метка сессии и CSRF-секрета: оба меняются при новом входе."""
+    session = getattr(request, 'session', None)
+    key = session.session_key if session is not None else None
+    tag = f'{key}:{request.META.get("CSRF_COOKIE")}'
+    return hashlib.md5(tag.encode()).hexdigest()[:12]
+
+
+def not_modified(request, *feeds):
+    """Ответ 304, если у клиента актуальная версия лент, иначе None.
+
+    Валидаторы берутся только из кэша версий, поэтому проверка идёт
+    до запроса ленты и рендера шаблона. Авторизованный пользователь
+    видит свою навигацию и кнопки подписки, так что его вариант
+    страницы зависит ещё и от его ленты подписок, а формы на ней —
+    от сессии и CSRF-токена, которые меняются при каждом входе.
+    """
+    viewer = 'anon'
+    if request.user.is_authenticated:
+        viewer = f'u{request.user.id}-{_session_tag(request)}'
+        feeds += (feed_cache.follow_feed(request.user.id),)
+    etag, modified = request.validators = validators(feeds, viewer)
+    return get_conditional_response(
+        request, etag=etag, last_modified=modified)
+
+
+def conditional_page(view):
+    """Проставляет ETag/Last-Modified из not_modified() и заголовки кэша.
+
+    Авторизованные варианты помечаются private, чтобы не попасть
+    в общие кэши, и no-cache: после своего комментария или подписки
+    браузер должен переспросить страницу, а не показать старую копию.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        response = view(request, *args, **kwargs)
+        validators = getattr(request, 'validators', None)
+        if validators and response.status_code in VALIDATED:
+            etag, modified = validators
+            response.setdefault('ETag', etag)
+            response.setdefault('Last-Modified', http_date(modified))
+        patch_vary_headers(response, ('Cookie',))
+        if request.user.is_authenticated:
+            patch_cache_control(response, private=True, no_cache=True)
+        else:
+            patch_cache_control(response, max_age=0)
+        return response
+    return wrapper
@@ -0,0 +1,90 @@
+import csv
+import json
+from collections import defaultdict
+
+from .models import Comment, Post
+from .utils import KEYSET, batched, keyset_filter
+
+CHUNK_SIZE = 500
+CSV_FIELDS = ('id', 'author', 'text', 'group', 'pub_date')
+FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def posts_for(author=None, group=None, since=None, after_id=0):
+    """Посты автора или группы по возрастанию (pub_date, id).
+
+    С since — только после позиции (since, after_id): так экспорт
+    продолжается с последней полученной строки.
+    """
+    posts = Post.objects.select_related('author', 'group')
+    if author is not None:
+        posts = posts.filter(author=author)
+    if group is not None:
+        posts = posts.filter(group=group)
+    if since is None:
+        return posts.order_by(*KEYSET)
+    return keyset_filter(posts, KEYSET, since, after_id, backward=True)
+
+
+def boundary(posts, limit):
+    """Позиция последней из первых limit строк и есть ли строки за ней."""
+    last = posts.values_list(*KEYSET)[limit - 1:limit].first()
+    if last is None:
+        return None
+    return last if keyset_filter(
+        posts, KEYSET, *last, backward=True).exists() else None
+
+
+def _rows(posts, chunk_size, comments):
+    # iterator() не подтягивает prefetch_related, поэтому комментарии
+    # читаются одним запросом на каждую пачку постов.
+    for chunk in batched(posts.iterator(chunk_size=chunk_size), chunk_size):
+        threads = defaultdict(list)
+        if comments:
+            for comment in Comment.objects.filter(
+                post_id__in=[post.id for post in chunk]
+            ).select_related('author').order_by('created', 'id'):
+                threads[comment.post_id].append({
+                    'author': comment.author.username,
+                    'text': comment.text,
+                    'created': comment.created.isoformat(),
+                })
+        for post in chunk:
+            row = {
+                'id': post.id,
+                'author': post.author.username,
+                'text': post.text,
+                'group': post.group.slug if post.group else None,
+                'pub_date': post.pub_date.isoformat(),
+            }
+            if comments:
+                row['comments'] = threads[post.id]
+            yield row
+
+
+def ndjson(posts, chunk_size=CHUNK_SIZE):
+    """Строки NDJSON в формате, который читает import_posts."""
+    for row in _rows(posts, chunk_size, comments=True):
+        yield json.dumps(row, ensure_ascii=False) + '\n'
+
+
+class _Echo:
+    def write(self, value):
+        return value
+
+
+def csv_lines(posts, chunk_size=CHUNK_SIZE):
+    """Строки CSV без комментариев: их не уложить в плоскую таблицу."""
+    writer = csv.writer(_Echo())
+    yield writer.writerow(CSV_FIELDS)
+    for row in _rows(posts, chunk_size, comments=False):
+        yield writer.writerow([row[field] or '' for field in CSV_FIELDS])
+
+
+def serialize(posts, file_format, chunk_size=CHUNK_SIZE):
+    if file_format == 'csv':
+        return csv_lines(posts, chunk_size)
+    return ndjson(posts, chunk_size)
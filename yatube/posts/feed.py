@@ -0,0 +1,298 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.functional import cached_property
+
+from . import feed_cache
+from .models import FeedEntry, Follow, Post, UserStats
+from .utils import batched, keyset_filter
+
+BATCH_SIZE = 1000
+CELEBRITIES_KEY = 'posts:celebrities'
+CELEBRITIES_TIMEOUT = 5 * 60
+
+
+def _threshold():
+    return getattr(settings, 'POSTS_CELEBRITY_FOLLOWERS', None)
+
+
+def _lower_threshold():
+    return getattr(
+        settings, 'POSTS_CELEBRITY_FOLLOWERS_DOWN', None) or _threshold()
+
+
+def celebrity_ids():
+    """Авторы с флагом UserStats.celebrity.
+
+    Их посты не раскладываются по лентам, а читаются при показе.
+    Флаг ставит promote() при подписке, а снимает demote() в фоне.
+    """
+    ids = cache.get(CELEBRITIES_KEY)
+    if ids is None:
+        ids = frozenset(
+            UserStats.objects.filter(
+                celebrity=True).values_list('user_id', flat=True)
+        )
+        cache.set(CELEBRITIES_KEY, ids, CELEBRITIES_TIMEOUT)
+    return ids
+
+
+def is_celebrity(author_id):
+    return author_id in celebrity_ids()
+
+
+def promote(author_id):
+    """Делает автора знаменитостью, если он набрал порог подписчиков."""
+    threshold = _threshold()
+    if not threshold:
+        return False
+    promoted = UserStats.objects.filter(
+        user_id=author_id, celebrity=False,
+        followers_count__gte=threshold
+    ).update(celebrity=True)
+    if promoted:
+        feed_cache.after_commit(cache.delete, CELEBRITIES_KEY)
+    return bool(promoted)
+
+
+def demotable():
+    """Знаменитости, у которых подписчиков меньше нижнего порога.
+
+    Зазор между порогами не даёт автору на границе то и дело
+    переходить из одного режима в другой.
+    """
+    stats = UserStats.objects.filter(celebrity=True)
+    threshold = _lower_threshold()
+    if threshold:
+        stats = stats.filter(followers_count__lt=threshold)
+    return list(stats.values_list('user_id', flat=True))
+
+
+def demote(author_id):
+    """Переводит автора в обычные: раскладывает его посты по лентам.
+
+    Долгая операция для фоновой команды demote_celebrities. Пока она
+    идёт, флаг стоит и посты автора читаются при показе, так что
+    ленты подписчиков не теряют их ни на минуту. Возвращает id
+    подписчиков.
+    """
+    with transaction.atomic():
+        user_ids = backfill_author(author_id)
+        UserStats.objects.filter(user_id=author_id).update(celebrity=False)
+    feeds = feed_cache.follow_feeds(user_ids)
+    feed_cache.after_commit(cache.delete, CELEBRITIES_KEY)
+    feed_cache.after_commit(feed_cache.reset_counts, feeds)
+    feed_cache.after_commit(feed_cache.bump_versions, feeds)
+    return user_ids
+
+
+def _insert(entries):
+    for batch in batched(entries, BATCH_SIZE):
+        FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def follower_ids(author_id):
+    return list(Follow.objects.filter(
+        author_id=author_id).values_list('user_id', flat=True))
+
+
+def follower_feeds(post):
+    """Ленты подписчиков, в которые пост был разложен."""
+    if is_celebrity(post.author_id):
+        return []
+    return feed_cache.follow_feeds(follower_ids(post.author_id))
+
+
+def fan_out(post, user_ids):
+    """Раскладывает новый пост по лентам подписчиков автора."""
+    with transaction.atomic():
+        _insert(
+            FeedEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+            for user_id in user_ids
+        )
+
+
+def move(post):
+    """Перекладывает пост из лент прежнего автора в ленты нового.
+
+    Возвращает id читателей, из лент которых пост убран, и id тех,
+    в чьи ленты он разложен.
+    """
+    entries = FeedEntry.objects.filter(post=post)
+    removed = list(entries.values_list('user_id', flat=True))
+    entries.delete()
+    added = []
+    if not is_celebrity(post.author_id):
+        added = follower_ids(post.author_id)
+        fan_out(post, added)
+    return removed, added
+
+
+def fan_out_many(posts):
+    """Раскладывает пачку новых постов; возвращает id подписчиков.
+
+    Для массовой загрузки: подписчики всех авторов пачки читаются
+    одним запросом на каждые BATCH_SIZE авторов.
+    """
+    authors = {post.author_id for post in posts} - celebrity_ids()
+    followers = defaultdict(list)
+    for chunk in batched(authors, BATCH_SIZE):
+        for user_id, author_id in Follow.objects.filter(
+                author_id__in=chunk).values_list('user_id', 'author_id'):
+            followers[author_id].append(user_id)
+    _insert(
+        FeedEntry(user_id=user_id, post_id=post.id, pub_date=post.pub_date)
+        for post in posts
+        for user_id in followers.get(post.author_id, ())
+    )
+    return {user_id for users in followers.values() for user_id in users}
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные посты автора."""
+    posts = Post.objects.filter(
+        author_id=author_id).values_list('id', 'pub_date')
+    with transaction.atomic():
+        _insert(
+            FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for post_id, pub_date in posts.iterator()
+        )
+
+
+def backfill_author(author_id):
+    """Раскладывает все посты автора по лентам всех его подписчиков.
+
+    Нужно, когда автор перестаёт быть знаменитостью (см. demote()):
+    его посты и подписки того времени в FeedEntry не попали.
+    Возвращает id подписчиков.
+    """
+    rows = Follow.objects.filter(
+        author_id=author_id, author__posts__isnull=False
+    ).values_list('user_id', 'author__posts__id', 'author__posts__pub_date')
+    with transaction.atomic():
+        _insert(
+            FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for user_id, post_id, pub_date in rows.iterator()
+        )
+    return follower_ids(author_id)
+
+
+def remove(user_id, author_id):
+    """Убирает посты автора из ленты отписавшегося пользователя."""
+    FeedEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def rebuild():
+    """Пересобирает все ленты подписок по таблице Follow.
+
+    Флаги знаменитостей заодно выставляются заново по верхнему порогу,
+    поэтому счётчики UserStats к этому времени должны быть точными.
+    """
+    threshold = _threshold()
+    stats = UserStats.objects.filter(celebrity=True)
+    if threshold:
+        stats = stats.filter(followers_count__lt=threshold)
+    stats.update(celebrity=False)
+    if threshold:
+        UserStats.objects.filter(
+            celebrity=False, followers_count__gte=threshold
+        ).update(celebrity=True)
+    cache.delete(CELEBRITIES_KEY)
+    rows = Follow.objects.exclude(
+        author_id__in=celebrity_ids()
+    ).filter(
+        author__posts__isnull=False
+    ).values_list('user_id', 'author__posts__id', 'author__posts__pub_date')
+    with transaction.atomic():
+        FeedEntry.objects.all().delete()
+        _insert(
+            FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date)
+            for user_id, post_id, pub_date in rows.iterator()
+        )
+    return FeedEntry.objects.count()
+
+
+class FollowFeed:
+    """Лента подписок пользователя.
+
+    Посты обычных авторов читаются из его FeedEntry одним диапазоном
+    индекса, посты знаменитостей — запросом к Post при показе. Оба
+    потока сливаются в SQL через UNION по (pub_date, id), так что
+    срез страницы, и с OFFSET тоже, делает база.
+    """
+    ordered = True
+
+    def __init__(self, user, position=None, celebrities=None):
+        self.user = user
+        self.position = position
+        if celebrities is not None:
+            self.celebrities = celebrities
+
+    @cached_property
+    def celebrities(self):
+        ids = celebrity_ids()
+        if not ids:
+            return []
+        return list(Follow.objects.filter(
+            user=self.user, author_id__in=ids
+        ).values_list('author_id', flat=True))
+
+    def cache_feeds(self):
+        """Ленты, от версий которых зависит кэш этой ленты подписок."""
+        return [feed_cache.follow_feed(self.user.id)] + [
+            feed_cache.profile_feed(author_id)
+            for author_id in self.celebrities
+        ]
+
+    def seek(self, date, pk, backward=False):
+        return FollowFeed(self.user, (date, pk, backward), self.celebrities)
+
+    def _streams(self):
+        pushed = FeedEntry.objects.filter(user=self.user)
+        pulled = Post.objects.filter(author_id__in=self.celebrities)
+        date, pk, backward = self.position or (None, None, False)
+        if self.position is None:
+            return (
+                pushed.order_by('-pub_date', '-post_id'),
+                pulled.order_by('-pub_date', '-id'),
+                backward,
+            )
+        return (
+            keyset_filter(pushed, ('pub_date', 'post_id'), date, pk, backward),
+            keyset_filter(pulled, ('pub_date', 'id'), date, pk, backward),
+            backward,
+        )
+
+    def __getitem__(self, key):
+        pushed, pulled, backward = self._streams()
+        if not self.celebrities:
+            return [
+                entry.post for entry in pushed.select_related(
+                    'post__author', 'post__group')[key]
+            ]
+        # В UNION идут только колонки индексов; совпавшие строки (пост
+        # в обоих потоках, если автор недавно стал знаменитостью)
+        # UNION схлопывает сам.
+        order = '' if backward else '-'
+        rows = pushed.order_by().values_list('post_id', 'pub_date').union(
+            pulled.order_by().values_list('id', 'pub_date')
+        ).order_by(f'{order}pub_date', f'{order}post_id')[key]
+        ids = [post_id for post_id, _ in rows]
+        posts = Post.objects.select_related('author', 'group').in_bulk(ids)
+        return [posts[post_id] for post_id in ids if post_id in posts]
+
+    def count(self):
+        pushed = feed_cache.get_count(
+            feed_cache.follow_feed(self.user.id),
+            FeedEntry.objects.filter(user=self.user).count
+        )
+        return pushed + sum(
+            feed_cache.get_count(
+                feed_cache.profile_feed(author_id),
+                Post.objects.filter(author_id=author_id).count
+            )
+            for author_id in self.celebrities
+        )
@@ -0,0 +1,154 @@
+import time
+from functools import partial
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+INDEX_FEED = 'index'
+COUNT_KEY = 'posts:count:{feed}'
+ESTIMATE_KEY = 'posts:estimate:{feed}'
+COUNT_TIMEOUT = 60 * 60
+VERSION_KEY = 'posts:version:{feed}'
+MODIFIED_KEY = 'posts:modified:{feed}'
+
+
+def group_feed(group_id):
+    return f'group:{group_id}'
+
+
+def profile_feed(author_id):
+    return f'profile:{author_id}'
+
+
+def follow_feed(user_id):
+    return f'follow:{user_id}'
+
+
+def post_feed(post_id):
+    """Версия страницы поста: правки и комментарии."""
+    return f'post:{post_id}'
+
+
+def counters_feed(user_id):
+    """Версия счётчиков подписчиков и подписок пользователя."""
+    return f'counters:{user_id}'
+
+
+def post_feeds(post):
+    """Ленты, в которых показывается пост."""
+    feeds = [INDEX_FEED, profile_feed(post.author_id)]
+    if post.group_id:
+        feeds.append(group_feed(post.group_id))
+    return feeds
+
+
+def follow_feeds(user_ids):
+    return [follow_feed(user_id) for user_id in user_ids]
+
+
+def after_commit(func, *args):
+    """Выполняет func(*args) после фиксации текущей транзакции.
+
+    Версии и счётчики лент сдвигаются только после COMMIT: иначе
+    запрос, пришедший между сдвигом и фиксацией, прочитает старые
+    строки и закэширует их под новой версией.
+    """
+    transaction.on_commit(partial(func, *args))
+
+
+def get_count(feed, counter, estimated=False):
+    """Счётчик постов ленты; при промахе считает его через counter().
+
+    Оценка (estimated) лежит отдельно от точного счётчика: она обрезана
+    сверху и сдвигать её нельзя.
+    """
+    key = (ESTIMATE_KEY if estimated else COUNT_KEY).format(feed=feed)
+    count = cache.get(key)
+    if count is None:
+        count = counter()
+        cache.add(key, count, COUNT_TIMEOUT)
+    return count
+
+
+def set_count(feed, count, estimated=False):
+    key = (ESTIMATE_KEY if estimated else COUNT_KEY).format(feed=feed)
+    cache.set(key, count, COUNT_TIMEOUT)
+
+
+def change_counts(feeds, delta):
+    """Сдвигает уже посчитанные счётчики; отсутствующие не трогает.
+
+    Оценки сбрасываются: их пересчёт ограничен и дёшев.
+    """
+    for feed in feeds:
+        try:
+            cache.incr(COUNT_KEY.format(feed=feed), delta)
+        except ValueError:
+            pass
+    cache.delete_many([ESTIMATE_KEY.format(feed=feed) for feed in feeds])
+
+
+def reset_counts(feeds):
+    cache.delete_many([
+        key.format(feed=feed)
+        for feed in feeds for key in (COUNT_KEY, ESTIMATE_KEY)
+    ])
+
+
+def get_version_map(*feeds):
+    """Версии лент словарём {лента: версия}.
+
+    Отсутствующая версия начинается с текущего времени в миллисекундах,
+    чтобы после вытеснения из кэша не совпасть с прежними значениями.
+    """
+    keys = {VERSION_KEY.format(feed=feed): feed for feed in feeds}
+    versions = cache.get_many(list(keys))
+    for key in keys:
+        if key not in versions:
+            cache.add(key, int(time.time() * 1000), None)
+            versions[key] = cache.get(key)
+    return {feed: versions[key] for key, feed in keys.items()}
+
+
+def get_versions(*feeds):
+    """Текущие версии лент для ключей кэша фрагментов."""
+    versions = get_version_map(*feeds)
+    return '.'.join(str(versions[feed]) for feed in feeds)
+
+
+def bump_versions(feeds):
+    """Делает устаревшими закэшированные фрагменты лент."""
+    now = time.time()
+    for feed in feeds:
+        key = VERSION_KEY.format(feed=feed)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, int(now * 1000), None)
+    cache.set_many(
+        {MODIFIED_KEY.format(feed=feed): now for feed in feeds}, None)
+
+
+def last_modified(*feeds):
+    """Время последнего изменения лент (timestamp).
+
+    Неизвестное время считается текущим: клиент просто получит
+    страницу заново, а следующие проверки уже совпадут.
+    """
+    keys = [MODIFIED_KEY.format(feed=feed) for feed in feeds]
+    times = cache.get_many(keys)
+    now = time.time()
+    for key in keys:
+        if key not in times:
+            cache.add(key, now, None)
+            times[key] = cache.get(key, now)
+    return max(times.values())
+
+
+def fragment_context(*feeds):
+    """Переменные шаблона для {% cache cache_timeout ... feed_version %}."""
+    return {
+        'cache_timeout': settings.POSTS_FEED_CACHE_TIMEOUT,
+        'feed_version': get_versions(*feeds),
+    }
@@ -1,5 +1,7 @@
-from django.forms import ModelForm
+from django.core.files.uploadedfile import UploadedFile
+from django.forms import ModelForm, ValidationError
 
+from . import images
 from .models import Post, Comment
 
 
@@ -16,6 +18,16 @@ class PostForm(ModelForm):
             'group': 'Группа, к которой будет относиться пост'
         }
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # Сохранённая раньше картинка поста уже прошла проверку.
+        if not isinstance(image, UploadedFile):
+            return image
+        try:
+            return images.ingest(image)
+        except ValueError as error:
+            raise ValidationError(str(error))
+
 
 class CommentForm(ModelForm):
     class Meta:
@@ -0,0 +1,69 @@
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.files import File
+from PIL import Image, ImageOps
+
+# Форматы, в которых уменьшенный оригинал сохраняется как был;
+# остальные пересохраняются в JPEG.
+KEEP_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'WEBP': 'webp'}
+JPEG_QUALITY = 90
+
+
+def target_size(size, max_pixels):
+    """Размер с теми же пропорциями и не больше max_pixels точек."""
+    width, height = size
+    scale = (max_pixels / (width * height)) ** 0.5
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
+
+def ingest(upload):
+    """Проверяет загруженную картинку и уменьшает слишком большую.
+
+    Возвращает файл, который нужно сохранить: исходный или уменьшенную
+    копию во временном файле на диске. Размеры читаются из заголовка
+    без декодирования, так что «бомба» отклоняется до распаковки;
+    ValueError — файл не годится.
+    """
+    if upload.size > settings.POSTS_IMAGE_MAX_BYTES:
+        raise ValueError('Файл картинки слишком большой.')
+    upload.seek(0)
+    with Image.open(upload) as image:
+        width, height = image.size
+        # Уменьшенным (draft) декодируется только JPEG, остальные
+        # форматы распаковываются целиком, и предел для них ниже.
+        limit = settings.POSTS_IMAGE_BOMB_PIXELS
+        if image.format != 'JPEG':
+            limit = min(limit, settings.POSTS_IMAGE_DECODE_PIXELS)
+        if width * height > limit:
+            raise ValueError('Слишком большое разрешение картинки.')
+        # Анимацию покадрово не пережимаем: она остаётся как есть.
+        if (width * height <= settings.POSTS_IMAGE_MAX_PIXELS
+                or getattr(image, 'is_animated', False)):
+            upload.seek(0)
+            return upload
+        size = target_size(image.size, settings.POSTS_IMAGE_MAX_PIXELS)
+        image_format = image.format
+        if image_format not in KEEP_FORMATS:
+            image_format = 'JPEG'
+        # draft() декодирует JPEG сразу в уменьшенном в 2–8 раз виде,
+        # поэтому полный кадр JPEG в память не попадает. Прочие форматы
+        # draft() не поддерживают и декодируются целиком (не больше
+        # POSTS_IMAGE_DECODE_PIXELS точек), а reducing_gap сначала
+        # сжимает кадр быстрым reduce().
+        image.draft('RGB', size)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail(size, Image.LANCZOS, reducing_gap=2.0)
+        if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        name = (
+            f'{os.path.splitext(upload.name)[0]}.'
+            f'{KEEP_FORMATS[image_format]}'
+        )
+        # Безымянный временный файл удаляется при закрытии сам,
+        # даже если форма так и не сохранится.
+        result = tempfile.TemporaryFile()
+        image.save(result, image_format, quality=JPEG_QUALITY)
+    result.seek(0)
+    return File(result, name=name)
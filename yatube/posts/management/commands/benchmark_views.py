@@ -0,0 +1,188 @@
+import os
+import subprocess
+from statistics import mean
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test import RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+
+from posts import perf, views
+from posts.models import Group, Post, User
+
+RESULTS_DIR = os.path.join(settings.BASE_DIR, '.benchmarks')
+METRIC = 'p50_ms'
+
+
+def current_commit():
+    """Короткий хеш HEAD; незакоммиченные изменения помечаются -dirty."""
+    def git(*args):
+        return subprocess.run(
+            ('git',) + args, cwd=settings.BASE_DIR, capture_output=True,
+            text=True, check=True
+        ).stdout.strip()
+    try:
+        commit = git('rev-parse', '--short', 'HEAD')
+        dirty = git('status', '--porcelain', '--untracked-files=no')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return f'{commit}-dirty' if dirty else commit
+
+
+def milliseconds(values):
+    return round(mean(values) * 1000, 3)
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеряет index, group_posts, profile, post_detail и follow_index '
+        'в процессе на текущей базе (заполните её seed_yatube), делит '
+        'время на ORM, шаблоны и остальной Python, сохраняет итоги по '
+        'коммиту и падает при замедлении относительно baseline.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument(
+            '--page', type=int, default=1,
+            help='Номер страницы для лент: глубокие страницы дороже.')
+        parser.add_argument(
+            '--warm-cache', action='store_true',
+            help='Не очищать кэш перед каждым запросом.')
+        parser.add_argument('--results-dir', default=RESULTS_DIR)
+        parser.add_argument(
+            '--baseline',
+            help='Коммит или путь к JSON; по умолчанию — последний '
+                 'сохранённый прогон другого коммита.')
+        parser.add_argument(
+            '--threshold', type=float, default=20,
+            help='Допустимый рост медианы времени вью, %%.')
+
+    def handle(self, *args, **options):
+        commit = current_commit()
+        results = {
+            'commit': commit,
+            'created': timezone.now().isoformat(),
+            'repeat': options['repeat'],
+            'page': options['page'],
+            'warm_cache': options['warm_cache'],
+            'views': {},
+        }
+        for name, view, request, kwargs in self.targets(options['page']):
+            results['views'][name] = self.measure(view, request, kwargs,
+                                                  options)
+        self.report(results['views'])
+
+        os.makedirs(options['results_dir'], exist_ok=True)
+        baseline = self.find_baseline(
+            options['baseline'], options['results_dir'], commit)
+        perf.dump(
+            results, os.path.join(options['results_dir'], f'{commit}.json'))
+        if baseline:
+            self.compare(results, baseline, options['threshold'])
+
+    def targets(self, page):
+        """Самые тяжёлые экземпляры каждой страницы в текущей базе."""
+        reader = User.objects.order_by('-stats__following_count').first()
+        author = User.objects.order_by('-stats__posts_count').first()
+        group = Group.objects.annotate(
+            total=Count('post')).order_by('-total').first()
+        post = Post.objects.annotate(
+            total=Count('comments')).order_by('-total').first()
+        if not (reader and group and post):
+            raise CommandError(
+                'База пуста: заполните её, например командой seed_yatube.')
+        factory = RequestFactory()
+        targets = (
+            ('index', 'posts:index', {}, True),
+            ('group_posts', 'posts:group_list', {'slug': group.slug}, True),
+            ('profile', 'posts:profile', {'username': author.username},
+             True),
+            ('post_detail', 'posts:post_detail', {'post_id': post.id},
+             False),
+            ('follow_index', 'posts:follow_index', {}, True),
+        )
+        for name, url_name, kwargs, paged in targets:
+            request = factory.get(
+                reverse(url_name, kwargs=kwargs),
+                {'page': page} if paged else {}
+            )
+            request.user = reader
+            yield name, getattr(views, name), request, kwargs
+
+    def measure(self, view, request, kwargs, options):
+        samples = []
+        for number in range(options['warmup'] + options['repeat']):
+            if not options['warm_cache']:
+                cache.clear()
+            with perf.ViewProfiler() as profiler:
+                response = view(request, **kwargs)
+            if response.status_code != 200:
+                raise CommandError(
+                    f'{request.path}: ответ {response.status_code}')
+            if number >= options['warmup']:
+                samples.append(profiler)
+        return {
+            'total': perf.summarize([sample.total for sample in samples]),
+            'orm_ms': milliseconds([sample.orm for sample in samples]),
+            'template_ms': milliseconds(
+                [sample.template for sample in samples]),
+            'python_ms': milliseconds([
+                sample.total - sample.orm - sample.template
+                for sample in samples
+            ]),
+            'queries': samples[-1].queries,
+        }
+
+    def find_baseline(self, baseline, results_dir, commit):
+        if baseline:
+            path = baseline
+            if not os.path.exists(path):
+                path = os.path.join(results_dir, f'{baseline}.json')
+            if not os.path.exists(path):
+                raise CommandError(f'Нет результатов baseline: {baseline}')
+            return perf.load(path)
+        previous = [
+            os.path.join(results_dir, name)
+            for name in os.listdir(results_dir)
+            if name.endswith('.json') and name != f'{commit}.json'
+        ]
+        if previous:
+            return perf.load(max(previous, key=os.path.getmtime))
+        return None
+
+    def report(self, results):
+        self.stdout.write(
+            f'{"Вью":<14}{"p50, мс":>10}{"p95, мс":>10}{"ORM":>9}'
+            f'{"шаблоны":>9}{"Python":>9}{"запросов":>10}'
+        )
+        for name, result in results.items():
+            total = result['total']
+            self.stdout.write(
+                f'{name:<14}{total["p50_ms"]:>10}{total["p95_ms"]:>10}'
+                f'{result["orm_ms"]:>9}{result["template_ms"]:>9}'
+                f'{result["python_ms"]:>9}{result["queries"]:>10}'
+            )
+
+    def compare(self, results, baseline, threshold):
+        def totals(data):
+            return {
+                name: result['total']
+                for name, result in data['views'].items()
+            }
+        regressions = perf.compare(
+            totals(results), totals(baseline), METRIC, threshold)
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(
+                f'Относительно {baseline["commit"]} ни одна вью не '
+                f'замедлилась больше чем на {threshold}%.'
+            ))
+            return
+        for name, before, after, growth in regressions:
+            self.stdout.write(self.style.ERROR(
+                f'{name}: {before} → {after} мс (+{growth}%)'))
+        raise CommandError(f'Замедление относительно {baseline["commit"]}.')
@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+
+from posts import feed
+
+
+class Command(BaseCommand):
+    help = (
+        'Переводит в обычные авторов, у которых подписчиков стало меньше '
+        'POSTS_CELEBRITY_FOLLOWERS_DOWN: раскладывает их посты по лентам '
+        'подписок. Запускается по расписанию, а не в запросе отписки.'
+    )
+
+    def handle(self, *args, **options):
+        authors = feed.demotable()
+        for author_id in authors:
+            followers = feed.demote(author_id)
+            self.stdout.write(
+                f'Автор {author_id}: лент подписчиков {len(followers)}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Переведено в обычные: {len(authors)}'))
@@ -0,0 +1,58 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from posts import export
+from posts.models import Group, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково выгружает посты автора или группы в NDJSON (с '
+        'комментариями, формат import_posts) или CSV.'
+    )
+
+    def add_arguments(self, parser):
+        target = parser.add_mutually_exclusive_group()
+        target.add_argument('--author', help='username автора.')
+        target.add_argument('--group', help='slug группы.')
+        parser.add_argument(
+            '--format', choices=sorted(export.FORMATS), default='ndjson')
+        parser.add_argument(
+            '--output', help='Файл для выгрузки; по умолчанию stdout.')
+        parser.add_argument(
+            '--since',
+            help='pub_date последнего выгруженного поста (ISO 8601).')
+        parser.add_argument(
+            '--after-id', type=int, default=0,
+            help='id последнего выгруженного поста с этой pub_date.')
+        parser.add_argument(
+            '--chunk-size', type=int, default=export.CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        if not (options['author'] or options['group']):
+            raise CommandError('Укажите --author или --group.')
+        filters = {}
+        try:
+            if options['author']:
+                filters['author'] = User.objects.get(
+                    username=options['author'])
+            else:
+                filters['group'] = Group.objects.get(slug=options['group'])
+        except (User.DoesNotExist, Group.DoesNotExist):
+            raise CommandError('Автор или группа не найдены.')
+        since = options['since']
+        if since is not None:
+            since = parse_datetime(since)
+            if since is None:
+                raise CommandError('Неверная дата --since.')
+        posts = export.posts_for(
+            since=since, after_id=options['after_id'], **filters)
+        lines = export.serialize(
+            posts, options['format'], options['chunk_size'])
+        if not options['output']:
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['output'], 'w', encoding='utf-8',
+                  newline='') as file:
+            file.writelines(lines)
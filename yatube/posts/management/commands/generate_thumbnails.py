@@ -0,0 +1,68 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+
+from posts import thumbnails
+
+
+class Command(BaseCommand):
+    help = (
+        'Фоновый обработчик очереди миниатюр: строит миниатюры новых '
+        'картинок постов, пока шаблоны показывают вместо них заглушку. '
+        'С --loop работает постоянно, опрашивая очередь.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Потоков для декодирования и сжатия картинок.')
+        parser.add_argument(
+            '--loop', action='store_true',
+            help='Не завершаться, когда очередь пуста.')
+        parser.add_argument(
+            '--interval', type=float, default=2.0,
+            help='Пауза между опросами пустой очереди, с.')
+
+    def handle(self, *args, **options):
+        total = 0
+        while True:
+            posts = thumbnails.pending(options['batch_size'])
+            if posts:
+                self.build(posts, options['workers'])
+                total += len(thumbnails.mark_ready(posts))
+                self.stdout.write(f'\rГотово миниатюр: {total}', ending='')
+                continue
+            if not options['loop']:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'Построено миниатюр: {total}'))
+
+    def build(self, posts, workers):
+        if workers <= 1:
+            for post in posts:
+                self.generate(post)
+            return
+        # Pillow отпускает GIL на декодировании и ресайзе, так что
+        # потоки ускоряют пачку крупных картинок.
+        with ThreadPoolExecutor(workers) as pool:
+            list(pool.map(self.generate_in_thread, posts))
+
+    def generate(self, post):
+        # Битая картинка не должна навсегда застрять в очереди: пост
+        # снимается с неё, а шаблон попробует построить миниатюру сам.
+        try:
+            thumbnails.generate(post)
+        except Exception as error:
+            self.stderr.write(f'Пост {post.id}: {error}')
+
+    def generate_in_thread(self, post):
+        try:
+            self.generate(post)
+        finally:
+            connections.close_all()
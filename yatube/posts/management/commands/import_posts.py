@@ -0,0 +1,309 @@
+import csv
+import json
+import os
+import time
+from collections import Counter, OrderedDict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from posts import feed, feed_cache, search, stats
+from posts.models import Comment, Group, Post, User, UserStats
+from posts.utils import batched, explicit_dates
+
+LOOKUP_SIZE = 100000
+LOOKUP_CHUNK = 500
+MAX_REPORTED_ERRORS = 20
+
+
+class Lookup:
+    """Ограниченный LRU-кэш соответствий ключ → id.
+
+    Недостающие ключи пачки разрешаются одним запросом на LOOKUP_CHUNK
+    ключей, так что память не растёт с размером файла.
+    """
+
+    def __init__(self, model, field, create=None):
+        self.model = model
+        self.field = field
+        self.create = create
+        self.ids = OrderedDict()
+
+    def fetch(self, keys):
+        found = {}
+        for chunk in batched(keys, LOOKUP_CHUNK):
+            found.update(self.model.objects.filter(
+                **{f'{self.field}__in': chunk}
+            ).values_list(self.field, 'id'))
+        return found
+
+    def resolve(self, keys):
+        missing = {key for key in keys if key not in self.ids}
+        found = self.fetch(missing) if missing else {}
+        new = missing - set(found)
+        if new and self.create:
+            self.create(new)
+            found.update(self.fetch(new))
+        self.ids.update(found)
+        for key in keys & self.ids.keys():
+            self.ids.move_to_end(key)
+        while len(self.ids) > LOOKUP_SIZE:
+            self.ids.popitem(last=False)
+        return {key: self.ids[key] for key in keys if key in self.ids}
+
+
+def create_users(usernames):
+    users = User.objects.bulk_create(
+        [User(username=username, password='!') for username in usernames],
+        ignore_conflicts=True
+    )
+    created = User.objects.filter(
+        username__in=[user.username for user in users])
+    UserStats.objects.bulk_create(
+        [UserStats(user_id=pk) for pk in created.values_list('id', flat=True)],
+        ignore_conflicts=True
+    )
+
+
+def create_groups(slugs):
+    Group.objects.bulk_create(
+        [Group(title=slug, slug=slug, description='') for slug in slugs],
+        ignore_conflicts=True
+    )
+
+
+def parse_date(value):
+    if not value:
+        return timezone.now()
+    date = parse_datetime(value)
+    if date is None:
+        raise ValueError(f'неверная дата {value!r}')
+    if timezone.is_naive(date):
+        date = timezone.make_aware(date)
+    return date
+
+
+def read_lines(file, offset):
+    """Строки файла со смещением в байтах после каждой из них."""
+    file.seek(offset)
+    for line in file:
+        offset += len(line)
+        yield line.decode('utf-8-sig'), offset
+
+
+def read_jsonl(file, offset):
+    for line, offset in read_lines(file, offset):
+        if not line.strip():
+            continue
+        try:
+            yield json.loads(line), offset
+        except ValueError as error:
+            yield error, offset
+
+
+def read_csv(file, offset):
+    header = next(csv.reader([file.readline().decode('utf-8-sig')]))
+    offset = max(offset, file.tell())
+    lines = read_lines(file, offset)
+    positions = []
+
+    def text():
+        # csv.reader берёт следующую строку, только когда запись
+        # не закончена, поэтому последнее смещение — конец записи.
+        for line, position in lines:
+            positions.append(position)
+            yield line
+
+    for values in csv.reader(text()):
+        position = positions.pop()
+        positions.clear()
+        if values:
+            yield dict(zip(header, values)), position
+
+
+class Command(BaseCommand):
+    help = (
+        'Потоково импортирует посты (и в JSONL — их комментарии) из JSONL '
+        'или CSV пачками bulk_create в отдельных транзакциях. После каждой '
+        'пачки пишет контрольную точку, с которой можно продолжить.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path')
+        parser.add_argument(
+            '--format', choices=('jsonl', 'csv'),
+            help='По умолчанию определяется по расширению файла.')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--checkpoint',
+            help='Файл контрольной точки, по умолчанию <path>.checkpoint.')
+        parser.add_argument(
+            '--restart', action='store_true',
+            help='Начать с начала файла, игнорируя контрольную точку.')
+        parser.add_argument(
+            '--create-authors', action='store_true',
+            help='Создавать неизвестных авторов без пароля.')
+        parser.add_argument(
+            '--create-groups', action='store_true',
+            help='Создавать неизвестные группы по slug.')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'Файл {path} не найден.')
+        file_format = options['format'] or (
+            'csv' if path.lower().endswith('.csv') else 'jsonl')
+        self.checkpoint = options['checkpoint'] or f'{path}.checkpoint'
+        state = self.load_checkpoint(path, options['restart'])
+        self.authors = Lookup(
+            User, 'username',
+            create_users if options['create_authors'] else None)
+        self.groups = Lookup(
+            Group, 'slug',
+            create_groups if options['create_groups'] else None)
+        self.errors = 0
+
+        reader = read_csv if file_format == 'csv' else read_jsonl
+        started = time.monotonic()
+        imported = 0
+        with open(path, 'rb') as file:
+            rows = reader(file, state['offset'])
+            for batch in batched(rows, options['batch_size']):
+                state['rows'] += len(batch)
+                state['offset'] = batch[-1][1]
+                posts = self.import_batch(
+                    [row for row, _ in batch], state['rows'] - len(batch))
+                imported += posts
+                state['imported'] += posts
+                self.save_checkpoint(state)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'\rПостов: {state["imported"]}, записей: {state["rows"]}'
+                    f' ({imported / max(elapsed, 1e-6):.0f} постов/с)',
+                    ending=''
+                )
+        elapsed = time.monotonic() - started
+        self.stdout.write('')
+        self.stdout.write(self.style.SUCCESS(
+            f'Импортировано {imported} постов за {elapsed:.1f} с '
+            f'({imported / max(elapsed, 1e-6):.0f}/с), пропущено записей: '
+            f'{self.errors}.'
+        ))
+
+    def load_checkpoint(self, path, restart):
+        state = {'source': os.path.abspath(path), 'offset': 0, 'rows': 0,
+                 'imported': 0}
+        if restart or not os.path.exists(self.checkpoint):
+            return state
+        with open(self.checkpoint, encoding='utf-8') as file:
+            saved = json.load(file)
+        if saved.get('source') != state['source']:
+            raise CommandError(
+                f'Контрольная точка {self.checkpoint} относится к другому '
+                'файлу; укажите --checkpoint или --restart.')
+        self.stdout.write(
+            f'Продолжаем с записи {saved["rows"] + 1} '
+            f'(уже импортировано {saved["imported"]} постов).')
+        return saved
+
+    def save_checkpoint(self, state):
+        # Точка пишется сразу после коммита пачки: при сбое между ними
+        # повторно загрузится не больше одной пачки.
+        temporary = f'{self.checkpoint}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as file:
+            json.dump(state, file)
+        os.replace(temporary, self.checkpoint)
+
+    def skip(self, number, reason):
+        self.errors += 1
+        if self.errors <= MAX_REPORTED_ERRORS:
+            self.stderr.write(f'Запись {number}: {reason}')
+
+    def build(self, rows, first_row):
+        """Посты и их комментарии; строки с ошибками пропускаются."""
+        valid = []
+        for number, row in enumerate(rows, first_row + 1):
+            if not isinstance(row, dict):
+                self.skip(number, row)
+            elif not row.get('author') or not row.get('text'):
+                self.skip(number, 'нужны author и text')
+            else:
+                valid.append((number, row))
+        usernames = {row['author'] for _, row in valid} | {
+            comment.get('author') for _, row in valid
+            for comment in row.get('comments') or ()
+            if isinstance(comment, dict)
+        }
+        authors = self.authors.resolve(usernames - {None})
+        groups = self.groups.resolve(
+            {row['group'] for _, row in valid if row.get('group')})
+
+        posts, comments = [], []
+        for number, row in valid:
+            if row['author'] not in authors:
+                self.skip(number, f'нет автора {row["author"]!r}')
+                continue
+            if row.get('group') and row['group'] not in groups:
+                self.skip(number, f'нет группы {row["group"]!r}')
+                continue
+            try:
+                post = Post(
+                    text=row['text'],
+                    author_id=authors[row['author']],
+                    group_id=groups.get(row.get('group')),
+                    pub_date=parse_date(row.get('pub_date')),
+                )
+                post_comments = [
+                    Comment(
+                        author_id=authors[comment['author']],
+                        text=comment['text'],
+                        created=parse_date(comment.get('created')),
+                    )
+                    for comment in row.get('comments') or ()
+                ]
+            except (KeyError, TypeError, ValueError) as error:
+                self.skip(number, f'неверный комментарий или дата: {error}')
+                continue
+            posts.append(post)
+            comments.append(post_comments)
+        return posts, comments
+
+    def import_batch(self, rows, first_row):
+        posts, comments = self.build(rows, first_row)
+        if not posts:
+            return 0
+        dates = (Post._meta.get_field('pub_date'),
+                 Comment._meta.get_field('created'))
+        with transaction.atomic(), explicit_dates(*dates):
+            last_id = Post.objects.aggregate(last=Max('id'))['last'] or 0
+            Post.objects.bulk_create(posts)
+            if posts[0].id is None:
+                # SQLite не возвращает id из bulk_create; внутри
+                # транзакции новые id идут подряд после last_id.
+                ids = Post.objects.filter(
+                    id__gt=last_id).order_by('id').values_list('id', flat=True)
+                for post, pk in zip(posts, ids):
+                    post.id = pk
+            for post, post_comments in zip(posts, comments):
+                for comment in post_comments:
+                    comment.post_id = post.id
+            last_comment_id = Comment.objects.aggregate(
+                last=Max('id'))['last'] or 0
+            Comment.objects.bulk_create(
+                [comment for post_comments in comments
+                 for comment in post_comments])
+            stats.change_many('posts_count', Counter(
+                post.author_id for post in posts))
+            followers = feed.fan_out_many(posts)
+            search.index_after(Post, last_id)
+            search.index_after(Comment, last_comment_id)
+
+        feeds = {name for post in posts for name in
+                 feed_cache.post_feeds(post)}
+        feeds.update(feed_cache.follow_feeds(followers))
+        feed_cache.reset_counts(feeds)
+        feed_cache.bump_versions(feeds)
+        return len(posts)
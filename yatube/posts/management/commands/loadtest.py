@@ -0,0 +1,291 @@
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from importlib import import_module
+from itertools import count
+
+import requests
+from django.conf import settings
+from django.contrib.auth import (
+    BACKEND_SESSION_KEY, HASH_SESSION_KEY, SESSION_KEY
+)
+from django.contrib.staticfiles.handlers import StaticFilesHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Count
+from django.test.testcases import LiveServerThread
+from django.test.utils import override_settings
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+
+from posts import perf
+from posts.models import Group, Post, User
+from posts.utils import POST_LIMIT
+
+DEFAULT_MIX = (
+    'index=30,group_list=15,profile=15,post_detail=20,follow_index=5,'
+    'add_comment=5,profile_follow=5,profile_unfollow=5'
+)
+AUTHORIZED = {
+    'follow_index', 'add_comment', 'profile_follow', 'profile_unfollow'
+}
+SAMPLE_SIZE = 1000
+TARGET_PREFIX = 'target_'
+TIMEOUT = 30
+
+
+def parse_mix(value):
+    """Разбирает строку вида 'index=30,profile=10' в {имя: вес}."""
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        try:
+            mix[name.strip()] = float(weight)
+        except ValueError:
+            raise CommandError(f'Неверный вес в --mix: {item!r}')
+    return mix
+
+
+def login_cookies(user):
+    """Cookie сессии и CSRF пользователя без похода в форму входа.
+
+    Сессия пишется в то же хранилище, что читает сервер, поэтому
+    нагружаемый экземпляр должен работать с той же базой и SECRET_KEY.
+    """
+    session = import_module(settings.SESSION_ENGINE).SessionStore()
+    session[SESSION_KEY] = user._meta.pk.value_to_string(user)
+    session[BACKEND_SESSION_KEY] = settings.AUTHENTICATION_BACKENDS[0]
+    session[HASH_SESSION_KEY] = user.get_session_auth_hash()
+    session.save()
+    return {
+        settings.SESSION_COOKIE_NAME: session.session_key,
+        settings.CSRF_COOKIE_NAME: get_random_string(32),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагружает Yatube смесью запросов из пула потоков и печатает '
+        'пропускную способность и p50/p95/p99 по именам URL. Без --url '
+        'поднимает собственный сервер на текущей базе. Запросы на запись '
+        'создают комментарии и подписки.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--url',
+            help='Адрес запущенного сервера, например http://127.0.0.1:8000.')
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument(
+            '--mix', default=DEFAULT_MIX,
+            help='Веса имён URL из posts/urls.py через запятую.')
+        parser.add_argument(
+            '--users', type=int,
+            help='Сколько пользователей залогинить (по умолчанию — по '
+                 'одному на поток; 0 — только анонимные запросы).')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--output', help='Куда записать JSON с итогами.')
+        parser.add_argument(
+            '--baseline', help='JSON прошлого прогона для сравнения.')
+        parser.add_argument(
+            '--threshold', type=float, default=10,
+            help='Допустимый рост p95 относительно baseline, %%.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.local = threading.local()
+        self.workers = count()
+        self.mix = parse_mix(options['mix'])
+        unknown = set(self.mix) - set(self.urls())
+        if unknown:
+            raise CommandError(f'Неизвестные имена URL: {sorted(unknown)}')
+        users = options['users']
+        if users is None:
+            users = options['concurrency']
+        self.sessions = [
+            login_cookies(user)
+            for user in User.objects.order_by('?')[:users]
+        ]
+        if not self.sessions:
+            self.mix = {
+                name: weight for name, weight in self.mix.items()
+                if name not in AUTHORIZED
+            }
+        self.load_samples()
+
+        if options['url']:
+            results = self.run(options['url'].rstrip('/'), options)
+        else:
+            results = self.run_live(options)
+        self.report(results)
+        if options['output']:
+            perf.dump(results, options['output'])
+        if options['baseline']:
+            self.compare(results, perf.load(options['baseline']),
+                         options['threshold'])
+
+    def urls(self):
+        """Имена URL, для которых есть генератор запросов target_*."""
+        return [
+            name[len(TARGET_PREFIX):] for name in dir(self)
+            if name.startswith(TARGET_PREFIX)
+        ]
+
+    def load_samples(self):
+        """Случайные посты, авторы и группы, к которым пойдут запросы."""
+        self.post_ids = list(Post.objects.order_by('?').values_list(
+            'id', flat=True)[:SAMPLE_SIZE])
+        self.usernames = list(User.objects.filter(
+            posts__isnull=False
+        ).distinct().order_by('?').values_list(
+            'username', flat=True)[:SAMPLE_SIZE])
+        self.groups = list(Group.objects.annotate(
+            total=Count('post')).values_list('slug', 'total'))
+        if not (self.post_ids and self.usernames and self.groups):
+            raise CommandError(
+                'В базе нет постов или групп: заполните её, например '
+                'командой seed_yatube.')
+
+    def run_live(self, options):
+        # Как и тестовый раннер, выключаем DEBUG: иначе в замеры
+        # попадает debug toolbar.
+        with override_settings(DEBUG=False):
+            server = LiveServerThread('localhost', StaticFilesHandler)
+            server.daemon = True
+            server.start()
+            server.is_ready.wait()
+            if server.error:
+                raise server.error
+            try:
+                return self.run(
+                    f'http://{server.host}:{server.port}', options)
+            finally:
+                server.terminate()
+
+    def run(self, base_url, options):
+        self.base_url = base_url
+        names = self.rng.choices(
+            list(self.mix), weights=list(self.mix.values()),
+            k=options['requests']
+        )
+        timings, errors = defaultdict(list), defaultdict(int)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as executor:
+            for name, elapsed, ok in executor.map(self.hit, names):
+                timings[name].append(elapsed)
+                errors[name] += not ok
+        elapsed = time.perf_counter() - started
+        urls = {}
+        for name in sorted(timings):
+            urls[name] = perf.summarize(timings[name], elapsed)
+            urls[name]['errors'] = errors[name]
+        total = perf.summarize(
+            [value for values in timings.values() for value in values],
+            elapsed
+        )
+        total['errors'] = sum(errors.values())
+        return {
+            'url': base_url,
+            'requests': options['requests'],
+            'concurrency': options['concurrency'],
+            'elapsed_s': round(elapsed, 3),
+            'total': total,
+            'urls': urls,
+        }
+
+    def worker(self):
+        """Сессия и генератор случайных чисел текущего потока."""
+        if not hasattr(self.local, 'session'):
+            number = next(self.workers)
+            self.local.rng = random.Random(f'{self.rng.random()}{number}')
+            self.local.session = requests.Session()
+            self.local.csrf = None
+            if self.sessions:
+                cookies = self.sessions[number % len(self.sessions)]
+                self.local.session.cookies.update(cookies)
+                self.local.csrf = cookies[settings.CSRF_COOKIE_NAME]
+        return self.local
+
+    def hit(self, name):
+        worker = self.worker()
+        method, path, data = getattr(self, TARGET_PREFIX + name)(worker)
+        started = time.perf_counter()
+        try:
+            response = worker.session.request(
+                method, self.base_url + path, data=data,
+                allow_redirects=False, timeout=TIMEOUT
+            )
+            ok = response.status_code < 400
+        except requests.RequestException:
+            ok = False
+        return name, time.perf_counter() - started, ok
+
+    def target_index(self, worker):
+        page = worker.rng.randint(1, 5)
+        return 'GET', f'{reverse("posts:index")}?page={page}', None
+
+    def target_group_list(self, worker):
+        slug, total = worker.rng.choice(self.groups)
+        # Глубокие страницы: равномерно по всей длине ленты группы.
+        page = worker.rng.randint(1, max(-(-total // POST_LIMIT), 1))
+        path = reverse('posts:group_list', args=(slug,))
+        return 'GET', f'{path}?page={page}', None
+
+    def target_profile(self, worker):
+        username = worker.rng.choice(self.usernames)
+        return 'GET', reverse('posts:profile', args=(username,)), None
+
+    def target_post_detail(self, worker):
+        post_id = worker.rng.choice(self.post_ids)
+        return 'GET', reverse('posts:post_detail', args=(post_id,)), None
+
+    def target_follow_index(self, worker):
+        return 'GET', reverse('posts:follow_index'), None
+
+    def target_add_comment(self, worker):
+        post_id = worker.rng.choice(self.post_ids)
+        return 'POST', reverse('posts:add_comment', args=(post_id,)), {
+            'text': 'Комментарий нагрузочного теста',
+            'csrfmiddlewaretoken': worker.csrf,
+        }
+
+    def target_profile_follow(self, worker):
+        username = worker.rng.choice(self.usernames)
+        return 'GET', reverse('posts:profile_follow', args=(username,)), None
+
+    def target_profile_unfollow(self, worker):
+        username = worker.rng.choice(self.usernames)
+        path = reverse('posts:profile_unfollow', args=(username,))
+        return 'GET', path, None
+
+    def report(self, results):
+        self.stdout.write(
+            f'{results["requests"]} запросов за {results["elapsed_s"]} с, '
+            f'{results["concurrency"]} потоков'
+        )
+        header = f'{"URL":<18}{"n":>6}{"err":>5}{"rps":>9}' + ''.join(
+            f'{f"p{rank}, мс":>11}' for rank in perf.PERCENTILES)
+        self.stdout.write(header)
+        rows = list(results['urls'].items()) + [('ВСЕГО', results['total'])]
+        for name, summary in rows:
+            self.stdout.write(
+                f'{name:<18}{summary["count"]:>6}{summary["errors"]:>5}'
+                f'{summary["rps"]:>9}' + ''.join(
+                    f'{summary[f"p{rank}_ms"]:>11}'
+                    for rank in perf.PERCENTILES
+                )
+            )
+
+    def compare(self, results, baseline, threshold):
+        regressions = perf.compare(
+            results['urls'], baseline.get('urls', {}), 'p95_ms', threshold)
+        if not regressions:
+            self.stdout.write(self.style.SUCCESS(
+                f'p95 не вырос больше чем на {threshold}% от baseline.'))
+            return
+        for name, before, after, growth in regressions:
+            self.stdout.write(self.style.ERROR(
+                f'{name}: p95 {before} → {after} мс (+{growth}%)'))
+        raise CommandError('Замедление относительно baseline.')
@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+
+from posts import stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает счётчики постов и подписок пользователей.'
+
+    def handle(self, *args, **options):
+        repaired = stats.repair()
+        self.stdout.write(
+            self.style.SUCCESS(f'Исправлено счётчиков: {repaired}'))
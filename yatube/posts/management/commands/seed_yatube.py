@@ -0,0 +1,185 @@
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+
+from posts import feed, search, stats
+from posts.models import Comment, Follow, Group, Post, User
+from posts.utils import batched, explicit_dates
+
+TEXT_POOL_SIZE = 2000
+DAY = timedelta(days=1).total_seconds()
+
+
+def power_law(rng, ids, alpha):
+    """Накопленные веса закона Ципфа для случайно перемешанных ids."""
+    ids = list(ids)
+    rng.shuffle(ids)
+    weights = (1 / rank ** alpha for rank in range(1, len(ids) + 1))
+    return ids, list(accumulate(weights))
+
+
+class Command(BaseCommand):
+    help = (
+        'Заполняет базу синтетическими пользователями, группами, постами, '
+        'комментариями и подписками для нагрузочных замеров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--groups', type=int, default=20)
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--comments', type=int, default=20000)
+        parser.add_argument('--follows', type=int, default=10000)
+        parser.add_argument(
+            '--days', type=int, default=365,
+            help='За сколько последних дней распределить посты.')
+        parser.add_argument(
+            '--alpha', type=float, default=1.1,
+            help='Показатель степенного закона для авторов и подписок.')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=5000)
+        parser.add_argument(
+            '--skip-derived', action='store_true',
+            help='Не пересобирать ленты подписок, счётчики и поисковый '
+                 'индекс.')
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        fake = Faker('ru_RU')
+        fake.seed_instance(options['seed'])
+        self.texts = [fake.sentence(nb_words=12)
+                      for _ in range(TEXT_POOL_SIZE)]
+        self.prefix = f's{options["seed"]}_'
+        if User.objects.filter(username__startswith=self.prefix).exists():
+            raise CommandError(
+                f'Данные с --seed {options["seed"]} уже загружены, '
+                'выберите другой seed.'
+            )
+
+        user_ids = self.create_users(options['users'])
+        group_ids = self.create_groups(options['groups'])
+        # Активность автора и его популярность ранжируются независимо:
+        # иначе самый активный автор собирает и всех подписчиков,
+        # а ленты подписок растут как произведение двух хвостов.
+        self.create_follows(
+            options['follows'], user_ids,
+            power_law(self.rng, user_ids, options['alpha'])
+        )
+        post_ids = self.create_posts(
+            options['posts'],
+            power_law(self.rng, user_ids, options['alpha']),
+            group_ids, options['days']
+        )
+        self.create_comments(
+            options['comments'],
+            power_law(self.rng, post_ids, options['alpha']),
+            user_ids
+        )
+        if not options['skip_derived']:
+            # Ленты делят авторов на знаменитостей по счётчикам.
+            self.timed('Счётчики пользователей', stats.repair)
+            self.timed('Ленты подписок', feed.rebuild)
+            self.timed('Поисковый индекс', search.rebuild)
+            cache.clear()
+
+    def timed(self, title, action):
+        started = time.monotonic()
+        result = action()
+        self.stdout.write(
+            f'{title}: {result} за {time.monotonic() - started:.1f} с')
+        return result
+
+    def insert(self, model, objects, total):
+        """Вставляет объекты пачками; возвращает id новых строк."""
+        last_id = model.objects.aggregate(last=Max('id'))['last'] or 0
+        started = time.monotonic()
+        inserted = 0
+        for batch in batched(objects, self.batch_size):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+            inserted += len(batch)
+            self.stdout.write(
+                f'\r{model._meta.verbose_name_plural}: {inserted}/{total}',
+                ending=''
+            )
+        elapsed = time.monotonic() - started
+        self.stdout.write(
+            f' за {elapsed:.1f} с ({inserted / max(elapsed, 1e-6):.0f}/с)')
+        return list(model.objects.filter(
+            id__gt=last_id).order_by('id').values_list('id', flat=True))
+
+    def create_users(self, total):
+        return self.insert(User, (
+            User(username=f'{self.prefix}{i}', password='!',
+                 first_name=f'Автор {i}')
+            for i in range(total)
+        ), total)
+
+    def create_groups(self, total):
+        return self.insert(Group, (
+            Group(title=f'Группа {i}', slug=f'{self.prefix}{i}',
+                  description=self.rng.choice(self.texts))
+            for i in range(total)
+        ), total)
+
+    def create_follows(self, total, user_ids, authors):
+        author_ids, cum_weights = authors
+
+        def follows():
+            for _ in range(total):
+                user_id = self.rng.choice(user_ids)
+                author_id = self.rng.choices(
+                    author_ids, cum_weights=cum_weights)[0]
+                if user_id != author_id:
+                    yield Follow(user_id=user_id, author_id=author_id)
+
+        self.insert(Follow, follows(), total)
+
+    def create_posts(self, total, authors, group_ids, days):
+        author_ids, cum_weights = authors
+        now = timezone.now()
+        span = timedelta(days=days).total_seconds()
+
+        def posts():
+            for _ in range(total):
+                yield Post(
+                    text=self.rng.choice(self.texts),
+                    author_id=self.rng.choices(
+                        author_ids, cum_weights=cum_weights)[0],
+                    group_id=(
+                        self.rng.choice(group_ids)
+                        if group_ids and self.rng.random() < 0.7 else None
+                    ),
+                    pub_date=now - timedelta(
+                        seconds=self.rng.random() * span),
+                )
+
+        with explicit_dates(Post._meta.get_field('pub_date')):
+            return self.insert(Post, posts(), total)
+
+    def create_comments(self, total, posts, user_ids):
+        post_ids, cum_weights = posts
+        now = timezone.now()
+
+        def comments():
+            for _ in range(total):
+                yield Comment(
+                    post_id=self.rng.choices(
+                        post_ids, cum_weights=cum_weights)[0],
+                    author_id=self.rng.choice(user_ids),
+                    text=self.rng.choice(self.texts),
+                    created=now - timedelta(
+                        seconds=self.rng.random() * DAY),
+                )
+
+        with explicit_dates(Comment._meta.get_field('created')):
+            self.insert(Comment, comments(), total)
@@ -0,0 +1,25 @@
+from django.db import migrations
+
+# Полнотекстовый индекс по тексту постов. Таблица хранит свою копию
+# текста: из неё строятся фрагменты с подсветкой, а синхронизацию
+# с posts_post ведут сигналы (posts/signals.py).
+CREATE = (
+    "CREATE VIRTUAL TABLE posts_post_fts USING fts5("
+    "text, tokenize = 'unicode61 remove_diacritics 2')"
+)
+FILL = (
+    'INSERT INTO posts_post_fts (rowid, text) '
+    'SELECT id, text FROM posts_post'
+)
+DROP = 'DROP TABLE posts_post_fts'
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0015_add_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunSQL([CREATE, FILL], DROP),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:29
+
+from django.db import migrations, models
+
+# Полнотекстовый индекс комментариев, устроен как posts_post_fts.
+CREATE = (
+    "CREATE VIRTUAL TABLE posts_comment_fts USING fts5("
+    "text, tokenize = 'unicode61 remove_diacritics 2')"
+)
+FILL = (
+    'INSERT INTO posts_comment_fts (rowid, text) '
+    'SELECT id, text FROM posts_comment'
+)
+DROP = 'DROP TABLE posts_comment_fts'
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0016_add_post_search'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['created', 'id'], name='comment_created_idx'),
+        ),
+        migrations.RunSQL([CREATE, FILL], DROP),
+    ]
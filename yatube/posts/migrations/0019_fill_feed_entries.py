@@ -0,0 +1,41 @@
+from django.conf import settings
+from django.db import migrations
+
+BATCH_SIZE = 1000
+
+
+def fill_feed_entries(apps, schema_editor):
+    """Раскладывает уже опубликованные посты по лентам подписчиков.
+
+    Повторяет posts.feed.rebuild на исторических моделях: посты
+    знаменитостей в ленты не попадают, они читаются при показе.
+    """
+    Follow = apps.get_model('posts', 'Follow')
+    FeedEntry = apps.get_model('posts', 'FeedEntry')
+    UserStats = apps.get_model('posts', 'UserStats')
+    follows = Follow.objects.filter(author__posts__isnull=False)
+    threshold = getattr(settings, 'POSTS_CELEBRITY_FOLLOWERS', None)
+    if threshold:
+        follows = follows.exclude(author_id__in=UserStats.objects.filter(
+            followers_count__gte=threshold).values('user_id'))
+    rows = follows.values_list(
+        'user_id', 'author__posts__id', 'author__posts__pub_date')
+    batch = []
+    for user_id, post_id, pub_date in rows.iterator():
+        batch.append(
+            FeedEntry(user_id=user_id, post_id=post_id, pub_date=pub_date))
+        if len(batch) == BATCH_SIZE:
+            FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    FeedEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0018_add_thumbnail_queue'),
+    ]
+
+    operations = [
+        migrations.RunPython(fill_feed_entries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def requeue_images(apps, schema_editor):
+    """Ставит в очередь миниатюр посты, загруженные до очереди.
+
+    Их варианты и метаданные строит generate_thumbnails: лента сама
+    миниатюры больше не строит.
+    """
+    Post = apps.get_model('posts', 'Post')
+    Post.objects.exclude(image='').exclude(image__isnull=True).update(
+        thumbnail_ready=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0019_fill_feed_entries'),
+    ]
+
+    operations = [
+        migrations.RunPython(requeue_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 2.2.16 on 2026-10-18 07:18
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_celebrities(apps, schema_editor):
+    """Флаг для авторов, чьи посты 0019 не разложила по лентам."""
+    threshold = getattr(settings, 'POSTS_CELEBRITY_FOLLOWERS', None)
+    if threshold:
+        apps.get_model('posts', 'UserStats').objects.filter(
+            followers_count__gte=threshold).update(celebrity=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0020_requeue_post_images'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userstats',
+            name='celebrity',
+            field=models.BooleanField(default=False, verbose_name='Знаменитость'),
+        ),
+        migrations.AddIndex(
+            model_name='userstats',
+            index=models.Index(condition=models.Q(celebrity=True), fields=['user'], name='userstats_celebrity_idx'),
+        ),
+        migrations.RunPython(mark_celebrities, migrations.RunPython.noop),
+    ]
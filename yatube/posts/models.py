@@ -37,6 +37,7 @@ class Post(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='posts',
+        db_index=False,
         verbose_name='Автор',
     )
     group = models.ForeignKey(
@@ -44,6 +45,7 @@ class Post(models.Model):
         blank=True,
         null=True,
         on_delete=models.SET_NULL,
+        db_index=False,
         verbose_name='Группа',
         help_text='Группа, к которой будет относиться пост'
     )
@@ -52,11 +54,41 @@ class Post(models.Model):
         upload_to='posts/',
         blank=True
     )
+    # Сбрасывается при загрузке картинки; миниатюры в фоне строит
+    # команда generate_thumbnails, а до тех пор шаблоны показывают
+    # заглушку.
+    thumbnail_ready = models.BooleanField(
+        'Миниатюра готова',
+        default=True,
+        editable=False
+    )
 
     class Meta:
         verbose_name = 'публикация'
         verbose_name_plural = 'публикации'
-        ordering = ('-pub_date',)
+        ordering = ('-pub_date', '-id')
+        # Индексы повторяют порядок лент: keyset-пагинация по
+        # (pub_date, id) внутри всей ленты, группы или автора.
+        indexes = [
+            models.Index(
+                fields=['pub_date', 'id'],
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=['group', 'pub_date', 'id'],
+                name='post_group_pub_date_idx'
+            ),
+            models.Index(
+                fields=['author', 'pub_date', 'id'],
+                name='post_author_pub_date_idx'
+            ),
+            # Очередь миниатюр: только посты, которые её ждут.
+            models.Index(
+                fields=['id'],
+                name='post_thumbnail_queue_idx',
+                condition=models.Q(thumbnail_ready=False)
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -67,6 +99,7 @@ class Comment(models.Model):
         Post,
         on_delete=models.CASCADE,
         related_name='comments',
+        db_index=False,
         verbose_name='Пост',
     )
     author = models.ForeignKey(
@@ -87,6 +120,17 @@ class Comment(models.Model):
     class Meta:
         verbose_name = 'комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(
+                fields=['post', 'created'],
+                name='comment_post_created_idx'
+            ),
+            # Порядок списка комментариев в админке.
+            models.Index(
+                fields=['created', 'id'],
+                name='comment_created_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -103,6 +147,7 @@ class Follow(models.Model):
         User,
         on_delete=models.CASCADE,
         related_name='following',
+        db_index=False,
         verbose_name='Автор, на которого подписываются'
     )
 
@@ -113,3 +158,93 @@ class Follow(models.Model):
                 name='uq_user_author'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['author', 'user'],
+                name='follow_author_user_idx'
+            ),
+        ]
+
+
+class FeedEntry(models.Model):
+    """Запись материализованной ленты подписок пользователя."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        db_index=False,
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата'
+    )
+
+    class Meta:
+        verbose_name = 'запись ленты подписок'
+        verbose_name_plural = 'Ленты подписок'
+        ordering = ('-pub_date',)
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'post'],
+                name='uq_feed_user_post'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-post'],
+                name='feed_user_pub_date_idx'
+            )
+        ]
+
+    def __str__(self):
+        return f'{self.user_id}: {self.post_id}'
+
+
+class UserStats(models.Model):
+    """Счётчики постов и подписок пользователя."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    posts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Постов'
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        db_index=True,
+        verbose_name='Подписчиков'
+    )
+    following_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписок'
+    )
+    # Посты знаменитостей не раскладываются по лентам подписок;
+    # флаг ставится и снимается по двум порогам, см. posts.feed.
+    celebrity = models.BooleanField(
+        default=False,
+        verbose_name='Знаменитость'
+    )
+
+    class Meta:
+        verbose_name = 'статистика пользователя'
+        verbose_name_plural = 'Статистика пользователей'
+        indexes = [
+            models.Index(
+                fields=['user'],
+                name='userstats_celebrity_idx',
+                condition=models.Q(celebrity=True)
+            ),
+        ]
+
+    def __str__(self):
+        return str(self.user_id)
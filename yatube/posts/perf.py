@@ -0,0 +1,123 @@
+import json
+import math
+import time
+
+from django.db.models.sql.compiler import SQLCompiler
+from django.template.backends.django import Template
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(values, rank):
+    """Перцентиль по методу ближайшего ранга; values уже отсортированы."""
+    if not values:
+        return None
+    index = max(math.ceil(rank / 100 * len(values)) - 1, 0)
+    return values[index]
+
+
+def summarize(timings, elapsed=None):
+    """Сводка по списку длительностей в секундах.
+
+    Значения в отчёте — миллисекунды; при известном elapsed
+    добавляется пропускная способность в запросах в секунду.
+    """
+    timings = sorted(timings)
+    summary = {'count': len(timings)}
+    if elapsed:
+        summary['rps'] = round(len(timings) / elapsed, 2)
+    if timings:
+        summary['mean_ms'] = round(sum(timings) / len(timings) * 1000, 3)
+    for rank in PERCENTILES:
+        value = percentile(timings, rank)
+        summary[f'p{rank}_ms'] = (
+            None if value is None else round(value * 1000, 3))
+    return summary
+
+
+def compare(current, baseline, metric, threshold):
+    """Замедления metric больше threshold процентов относительно baseline.
+
+    current и baseline — словари {имя: сводка}; возвращает список
+    (имя, было, стало, рост в процентах) для вышедших за порог.
+    """
+    regressions = []
+    for name, summary in current.items():
+        before = baseline.get(name, {}).get(metric)
+        after = summary.get(metric)
+        if not before or after is None:
+            continue
+        growth = (after - before) / before * 100
+        if growth > threshold:
+            regressions.append((name, before, after, round(growth, 1)))
+    return regressions
+
+
+def load(path):
+    with open(path, encoding='utf-8') as file:
+        return json.load(file)
+
+
+def dump(data, path):
+    with open(path, 'w', encoding='utf-8') as file:
+        json.dump(data, file, ensure_ascii=False, indent=2)
+
+
+class ViewProfiler:
+    """Делит время обработки запроса на ORM, шаблоны и остальное.
+
+    ORM — время SQLCompiler.execute_sql вместе с выборкой строк.
+    Запросы ленивых QuerySet выполняются во время рендера, поэтому их
+    время вычитается из времени шаблонов и учитывается только в ORM.
+    """
+
+    def __init__(self):
+        self.total = self.orm = self.template = 0.0
+        self.queries = 0
+        self.depth = 0
+        self.patched = []
+
+    def timed_sql(self, execute_sql):
+        def wrapper(compiler, *args, **kwargs):
+            # Компиляторы INSERT и UPDATE вызывают execute_sql родителя.
+            if self.depth:
+                return execute_sql(compiler, *args, **kwargs)
+            self.depth += 1
+            started = time.perf_counter()
+            try:
+                return execute_sql(compiler, *args, **kwargs)
+            finally:
+                self.orm += time.perf_counter() - started
+                self.queries += 1
+                self.depth -= 1
+        return wrapper
+
+    def timed_render(self, render):
+        def wrapper(template, *args, **kwargs):
+            orm, started = self.orm, time.perf_counter()
+            try:
+                return render(template, *args, **kwargs)
+            finally:
+                self.template += (
+                    time.perf_counter() - started - (self.orm - orm))
+        return wrapper
+
+    def patch(self, owner, name, wrap):
+        original = owner.__dict__[name]
+        self.patched.append((owner, name, original))
+        setattr(owner, name, wrap(original))
+
+    def __enter__(self):
+        self.patch(SQLCompiler, 'execute_sql', self.timed_sql)
+        for compiler in SQLCompiler.__subclasses__():
+            if 'execute_sql' in compiler.__dict__:
+                self.patch(compiler, 'execute_sql', self.timed_sql)
+        self.patch(Template, 'render', self.timed_render)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.total = time.perf_counter() - self.started
+        while self.patched:
+            owner, name, original = self.patched.pop()
+            setattr(owner, name, original)
@@ -0,0 +1,181 @@
+import base64
+import binascii
+import json
+import re
+
+from django.db import connection
+from django.utils.html import escape
+from django.utils.safestring import mark_safe
+
+from .models import Comment, Post
+from .utils import MAX_CURSOR_PK, batched
+
+TABLE = 'posts_post_fts'
+# Модель → таблица FTS5 с копией её поля text.
+TABLES = {Post: TABLE, Comment: 'posts_comment_fts'}
+PAGE_SIZE = 10
+MAX_TERMS = 8
+SNIPPET_TOKENS = 24
+# Границы совпадений в snippet(): управляющие символы не встречаются
+# в тексте поста и заменяются на <mark> уже после экранирования.
+MARK_START, MARK_END = '\x02', '\x03'
+TERM = re.compile(r'\w+')
+
+
+def match_expression(query):
+    """Запрос пользователя как выражение MATCH без синтаксиса FTS5.
+
+    Каждое слово берётся в кавычки, последнее ищется по префиксу,
+    чтобы находились и незаконченные слова. Пустая строка — нет слов.
+    """
+    terms = TERM.findall(query)[:MAX_TERMS]
+    if not terms:
+        return ''
+    return ' '.join(f'"{term}"' for term in terms) + '*'
+
+
+def encode_cursor(rank, pk):
+    token = base64.urlsafe_b64encode(json.dumps([rank, pk]).encode())
+    return token.decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """(rank, id) из токена; ValueError для неверного токена."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        rank, pk = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (binascii.Error, TypeError, ValueError):
+        raise ValueError('Неверный курсор поиска.')
+    # bool — тоже int, а числа вне BIGINT SQLite не примет.
+    if type(pk) is not int or not 0 < pk <= MAX_CURSOR_PK:
+        raise ValueError('Неверный курсор поиска.')
+    if type(rank) not in (int, float):
+        raise ValueError('Неверный курсор поиска.')
+    try:
+        rank = float(rank)
+    except OverflowError:
+        raise ValueError('Неверный курсор поиска.')
+    return rank, pk
+
+
+def highlight(snippet):
+    return mark_safe(
+        escape(snippet)
+        .replace(MARK_START, '<mark>')
+        .replace(MARK_END, '</mark>')
+    )
+
+
+def search(query, cursor=None, limit=PAGE_SIZE):
+    """Посты по запросу в порядке bm25 и курсор следующей страницы.
+
+    Страницы идут по ключу (rank, id) без OFFSET. У каждого поста
+    есть атрибут snippet — фрагмент текста с выделенными словами.
+    """
+    expression = match_expression(query)
+    if not expression:
+        return [], None
+    sql = (
+        f'SELECT rowid, rank, snippet({TABLE}, 0, %s, %s, %s, %s) '
+        f'FROM {TABLE} WHERE {TABLE} MATCH %s'
+    )
+    params = [MARK_START, MARK_END, '…', SNIPPET_TOKENS, expression]
+    if cursor is not None:
+        rank, pk = decode_cursor(cursor)
+        sql += ' AND (rank > %s OR (rank = %s AND rowid > %s))'
+        params += [rank, rank, pk]
+    sql += ' ORDER BY rank, rowid LIMIT %s'
+    params.append(limit + 1)
+    with connection.cursor() as db:
+        db.execute(sql, params)
+        rows = db.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        pk, rank, _ = rows[-1]
+        next_cursor = encode_cursor(rank, pk)
+    posts = Post.objects.select_related('author', 'group').in_bulk(
+        [pk for pk, _, _ in rows])
+    results = []
+    # Строки индекса без поста (удалён в обход сигналов) пропускаются.
+    for pk, _, snippet in rows:
+        if pk in posts:
+            posts[pk].snippet = highlight(snippet)
+            results.append(posts[pk])
+    return results, next_cursor
+
+
+def filter_matching(queryset, query):
+    """Оставляет в queryset постов или комментариев найденные по запросу."""
+    # RawSQL в id__in Django оборачивает в лишние скобки, и SQLite
+    # читает его как скалярный подзапрос, поэтому условие через extra().
+    table = TABLES[queryset.model]
+    return queryset.extra(
+        where=[f'{queryset.model._meta.db_table}.id IN '
+               f'(SELECT rowid FROM {table} WHERE {table} MATCH %s)'],
+        params=[match_expression(query)]
+    )
+
+
+def index(objects):
+    """Добавляет посты или комментарии в индекс или обновляет текст."""
+    with connection.cursor() as db:
+        for chunk in batched(objects, 500):
+            table = TABLES[type(chunk[0])]
+            remove(type(chunk[0]), [obj.id for obj in chunk])
+            db.executemany(
+                f'INSERT INTO {table} (rowid, text) VALUES (%s, %s)',
+                [(obj.id, obj.text) for obj in chunk]
+            )
+
+
+def index_after(model, last_id):
+    """Индексирует строки с id > last_id — после bulk_create без id."""
+    with connection.cursor() as db:
+        db.execute(
+            f'INSERT INTO {TABLES[model]} (rowid, text) '
+            f'SELECT id, text FROM {model._meta.db_table} WHERE id > %s',
+            [last_id]
+        )
+
+
+def remove(model, ids):
+    ids = list(ids)
+    if not ids:
+        return
+    placeholders = ', '.join(['%s'] * len(ids))
+    with connection.cursor() as db:
+        db.execute(
+            f'DELETE FROM {TABLES[model]} WHERE rowid IN ({placeholders})',
+            ids
+        )
+
+
+def remove_related(model, field, value):
+    """Снимает с индекса строки model, у которых field равно value.
+
+    Одним запросом: каскадное удаление не читает строки, и индекс
+    чистится так же, без списка id.
+    """
+    column = model._meta.get_field(field).column
+    with connection.cursor() as db:
+        db.execute(
+            f'DELETE FROM {TABLES[model]} WHERE rowid IN '
+            f'(SELECT id FROM {model._meta.db_table} WHERE {column} = %s)',
+            [value]
+        )
+
+
+def rebuild():
+    """Заполняет индексы заново из таблиц; число проиндексированных строк."""
+    indexed = 0
+    with connection.cursor() as db:
+        for model, table in TABLES.items():
+            db.execute(f'DELETE FROM {table}')
+            db.execute(
+                f'INSERT INTO {table} (rowid, text) '
+                f'SELECT id, text FROM {model._meta.db_table}'
+            )
+            indexed += db.rowcount
+            db.execute(f"INSERT INTO {table} ({table}) VALUES ('optimize')")
+    return indexed
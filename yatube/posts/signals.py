@@ -0,0 +1,176 @@
+from django.db.models.signals import (
+    post_delete, post_save, pre_delete, pre_save,
+)
+from django.dispatch import receiver
+
+from . import feed, feed_cache, search, stats
+from .models import Comment, Follow, Group, Post, User, UserStats
+
+
+# Кэш лент сбрасывается только после COMMIT, см. feed_cache.after_commit.
+def _bump_versions(feeds):
+    feed_cache.after_commit(feed_cache.bump_versions, feeds)
+
+
+def _change_counts(feeds, delta):
+    feed_cache.after_commit(feed_cache.change_counts, feeds, delta)
+
+
+def _reset_counts(feeds):
+    feed_cache.after_commit(feed_cache.reset_counts, feeds)
+
+
+def _follow_changed(follow):
+    feeds = [feed_cache.follow_feed(follow.user_id)]
+    _reset_counts(feeds)
+    _bump_versions(feeds + [
+        feed_cache.counters_feed(follow.user_id),
+        feed_cache.counters_feed(follow.author_id),
+    ])
+
+
+def _author_changed(post, previous_author_id):
+    """Переносит пост, переданный другому автору (например, в админке)."""
+    stats.change(previous_author_id, posts_count=-1)
+    stats.change(post.author_id, posts_count=1)
+    removed, added = feed.move(post)
+    removed_feeds = [feed_cache.profile_feed(previous_author_id)]
+    removed_feeds += feed_cache.follow_feeds(removed)
+    added_feeds = [feed_cache.profile_feed(post.author_id)]
+    added_feeds += feed_cache.follow_feeds(added)
+    _change_counts(removed_feeds, -1)
+    _change_counts(added_feeds, 1)
+    _bump_versions(removed_feeds + added_feeds)
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous(sender, instance, raw=False, **kwargs):
+    """Запоминает прежние группу и автора поста.
+
+    Новую картинку заодно ставит в очередь миниатюр.
+    """
+    if raw:
+        return
+    previous = None
+    if instance.pk is not None:
+        previous = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'author_id', 'image').first()
+    (
+        instance._previous_group_id,
+        instance._previous_author_id,
+        previous_image,
+    ) = previous or (None, None, '')
+    if instance.image and instance.image.name != previous_image:
+        instance.thumbnail_ready = False
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    search.index([instance])
+    feeds = feed_cache.post_feeds(instance)
+    if created:
+        stats.change(instance.author_id, posts_count=1)
+        user_ids = []
+        if not feed.is_celebrity(instance.author_id):
+            user_ids = feed.follower_ids(instance.author_id)
+            feed.fan_out(instance, user_ids)
+        feeds += feed_cache.follow_feeds(user_ids)
+        _change_counts(feeds, 1)
+        _bump_versions(feeds)
+        return
+    previous_author_id = getattr(instance, '_previous_author_id', None)
+    if previous_author_id not in (None, instance.author_id):
+        _author_changed(instance, previous_author_id)
+    _bump_versions(
+        feeds + [feed_cache.post_feed(instance.id)]
+        + feed.follower_feeds(instance)
+    )
+    previous_group_id = getattr(instance, '_previous_group_id', None)
+    if previous_group_id != instance.group_id:
+        if previous_group_id:
+            previous_group = feed_cache.group_feed(previous_group_id)
+            _bump_versions([previous_group])
+            _change_counts([previous_group], -1)
+        if instance.group_id:
+            _change_counts(
+                [feed_cache.group_feed(instance.group_id)], 1)
+
+
+@receiver(pre_delete, sender=Post)
+def post_deleting(sender, instance, **kwargs):
+    """Снимает с индекса комментарии удаляемого поста.
+
+    У Comment нет приёмников удаления, поэтому каскад удаляет их одним
+    DELETE, не читая строк. Версию поста сдвигает post_deleted.
+    """
+    search.remove_related(Comment, 'post', instance.id)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    search.remove(Post, [instance.id])
+    stats.change(instance.author_id, posts_count=-1)
+    feeds = feed_cache.post_feeds(instance) + feed.follower_feeds(instance)
+    _change_counts(feeds, -1)
+    # Версия самого поста тоже: иначе его страница и API отвечали бы
+    # 304 уже удалённому посту.
+    _bump_versions(feeds + [feed_cache.post_feed(instance.id)])
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index([instance])
+    _bump_versions([feed_cache.post_feed(instance.post_id)])
+
+
+# Приёмника post_delete у Comment нет намеренно: с ним каскад читал бы
+# и удалял комментарии по одному. Одиночное удаление обрабатывает
+# CommentAdmin, каскадное — post_deleting и user_deleting.
+
+
+@receiver(post_save, sender=Group)
+def group_saved(sender, instance, created, raw=False, **kwargs):
+    """Название и описание группы видны в её ленте и RSS."""
+    if not (raw or created):
+        _bump_versions([feed_cache.group_feed(instance.id)])
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, raw=False, **kwargs):
+    if raw or not created:
+        return
+    stats.change(instance.user_id, following_count=1)
+    stats.change(instance.author_id, followers_count=1)
+    feed.promote(instance.author_id)
+    if not feed.is_celebrity(instance.author_id):
+        feed.backfill(instance.user_id, instance.author_id)
+    _follow_changed(instance)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    stats.change(instance.user_id, following_count=-1)
+    stats.change(instance.author_id, followers_count=-1)
+    # Знаменитость, растерявшую подписчиков, переводит в обычные
+    # команда demote_celebrities: это долго для запроса отписки.
+    feed.remove(instance.user_id, instance.author_id)
+    _follow_changed(instance)
+
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        UserStats.objects.create(user=instance)
+
+
+@receiver(pre_delete, sender=User)
+def user_deleting(sender, instance, **kwargs):
+    """Снимает с индекса комментарии пользователя и к чужим постам."""
+    comments = Comment.objects.filter(author_id=instance.id)
+    post_ids = comments.values_list('post_id', flat=True).distinct()
+    _bump_versions([feed_cache.post_feed(post_id) for post_id in post_ids])
+    search.remove_related(Comment, 'author', instance.id)
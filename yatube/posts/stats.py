@@ -0,0 +1,94 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, IntegerField, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+from .models import Follow, Post, User, UserStats
+
+BATCH_SIZE = 1000
+COUNTERS = (
+    ('posts_count', Post, 'author'),
+    ('followers_count', Follow, 'author'),
+    ('following_count', Follow, 'user'),
+)
+FIELDS = [name for name, _, _ in COUNTERS]
+
+
+def _counted(model, field):
+    """Подзапрос: сколько строк model ссылается на пользователя."""
+    counts = model.objects.filter(
+        **{field: OuterRef('pk')}
+    ).order_by().values(field).annotate(total=Count('pk')).values('total')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def with_actual_counts(users):
+    """Аннотирует пользователей точными значениями счётчиков."""
+    return users.annotate(**{
+        f'actual_{name}': _counted(model, field)
+        for name, model, field in COUNTERS
+    })
+
+
+def _actual_stats(user):
+    return UserStats(user_id=user.pk, **{
+        name: getattr(user, f'actual_{name}') for name in FIELDS
+    })
+
+
+def change(user_id, **deltas):
+    """Сдвигает счётчики пользователя в текущей транзакции."""
+    UserStats.objects.filter(user_id=user_id).update(**{
+        name: F(name) + delta for name, delta in deltas.items()
+    })
+
+
+def change_many(name, deltas):
+    """Сдвигает счётчик name по словарю {user_id: сдвиг}.
+
+    Один UPDATE на каждое различное значение сдвига, а не на
+    пользователя: для массовой загрузки.
+    """
+    users = defaultdict(list)
+    for user_id, delta in deltas.items():
+        users[delta].append(user_id)
+    for delta, user_ids in users.items():
+        UserStats.objects.filter(user_id__in=user_ids).update(
+            **{name: F(name) + delta})
+
+
+def for_user(user):
+    """Счётчики пользователя; недостающая строка создаётся по данным."""
+    try:
+        return user.stats
+    except UserStats.DoesNotExist:
+        actual = _actual_stats(
+            with_actual_counts(User.objects.filter(pk=user.pk)).get())
+        stats, _ = UserStats.objects.get_or_create(
+            user=user,
+            defaults={name: getattr(actual, name) for name in FIELDS}
+        )
+        user.stats = stats
+        return stats
+
+
+def repair():
+    """Пересчитывает все счётчики; возвращает число исправленных строк."""
+    users = with_actual_counts(
+        User.objects.select_related('stats').order_by('pk'))
+    created, drifted = [], []
+    for user in users.iterator():
+        actual = _actual_stats(user)
+        try:
+            stats = user.stats
+        except UserStats.DoesNotExist:
+            created.append(actual)
+            continue
+        if any(getattr(stats, name) != getattr(actual, name)
+               for name in FIELDS):
+            drifted.append(actual)
+    # Размер пачки bulk_create подбирает бэкенд: явный BATCH_SIZE
+    # упирается в лимит составного SELECT у SQLite.
+    UserStats.objects.bulk_create(created)
+    UserStats.objects.bulk_update(drifted, FIELDS, batch_size=BATCH_SIZE)
+    return len(created) + len(drifted)
@@ -0,0 +1,154 @@
+from django.conf import settings
+from django.contrib.syndication.views import Feed
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.feedgenerator import Atom1Feed
+from django.utils.http import http_date
+from django.utils.text import Truncator
+
+from . import feed_cache
+from .conditional import validators
+from .models import Group, Post, User
+
+ITEMS = 20
+TITLE_WORDS = 8
+RENDERED_KEY = 'posts:syndication:{name}:{version}'
+
+
+class CachedFeed(Feed):
+    """RSS-лента постов, закэшированная по версии ленты сайта.
+
+    Читалки опрашивают ленты часто, а меняются они редко: ответ
+    собирается из кэша версий (304) или из готового XML, и только
+    после изменения ленты XML рендерится заново. Ленту кэша задаёт
+    cache_feed: атрибут или метод от obj, как title и link у Feed.
+    """
+    feed_type_name = 'rss'
+
+    def __call__(self, request, *args, **kwargs):
+        obj = self.get_object(request, *args, **kwargs)
+        feed = self._get_dynamic_attr('cache_feed', obj)
+        etag, modified = validators([feed], self.feed_type_name)
+        response = get_conditional_response(
+            request, etag=etag, last_modified=modified)
+        if response is None:
+            # В XML абсолютные ссылки: у каждого хоста и схемы свой.
+            key = RENDERED_KEY.format(
+                name=f'{self.feed_type_name}:{request.scheme}:'
+                     f'{request.get_host()}:{feed}',
+                version=etag)
+            rendered = cache.get(key)
+            if rendered is None:
+                feedgen = self.get_feed(obj, request)
+                response = HttpResponse(content_type=feedgen.content_type)
+                feedgen.write(response, 'utf-8')
+                rendered = response['Content-Type'], response.content
+                cache.set(key, rendered, settings.POSTS_FEED_CACHE_TIMEOUT)
+            response = HttpResponse(rendered[1], content_type=rendered[0])
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(modified)
+        patch_cache_control(response, public=True, max_age=0)
+        return response
+
+    def items(self, obj):
+        return self.posts(obj).order_by('-pub_date', '-id')[:ITEMS]
+
+    def item_title(self, post):
+        return Truncator(post.text).words(TITLE_WORDS)
+
+    def item_description(self, post):
+        return post.text
+
+    def item_link(self, post):
+        return reverse('posts:post_detail', args=(post.id,))
+
+    def item_author_name(self, post):
+        return post.author.get_full_name() or post.author.username
+
+    def item_author_link(self, post):
+        return reverse('posts:profile', args=(post.author.username,))
+
+    def item_pubdate(self, post):
+        return post.pub_date
+
+    def item_categories(self, post):
+        return (post.group.title,) if post.group else ()
+
+
+class LatestPostsFeed(CachedFeed):
+    title = 'Yatube: последние посты'
+    description = 'Новые посты всех авторов Yatube.'
+    cache_feed = feed_cache.INDEX_FEED
+
+    def link(self):
+        return reverse('posts:index')
+
+    def posts(self, obj):
+        return Post.objects.select_related('author', 'group')
+
+
+class GroupPostsFeed(CachedFeed):
+    def get_object(self, request, slug):
+        return get_object_or_404(Group, slug=slug)
+
+    def title(self, group):
+        return f'Yatube: {group.title}'
+
+    def description(self, group):
+        return group.description
+
+    def link(self, group):
+        return reverse('posts:group_list', args=(group.slug,))
+
+    def cache_feed(self, group):
+        return feed_cache.group_feed(group.id)
+
+    def posts(self, group):
+        # Группа уже известна: без JOIN с ней в каждой строке.
+        return Post.objects.filter(group=group).select_related('author')
+
+    def item_categories(self, post):
+        return ()
+
+
+class AuthorPostsFeed(CachedFeed):
+    def get_object(self, request, username):
+        return get_object_or_404(User, username=username)
+
+    def title(self, author):
+        return f'Yatube: {author.get_full_name() or author.username}'
+
+    def description(self, author):
+        return f'Посты пользователя {author.username}.'
+
+    def link(self, author):
+        return reverse('posts:profile', args=(author.username,))
+
+    def cache_feed(self, author):
+        return feed_cache.profile_feed(author.id)
+
+    def posts(self, author):
+        return author.posts.select_related('author', 'group')
+
+
+class AtomMixin:
+    feed_type = Atom1Feed
+    feed_type_name = 'atom'
+
+    def subtitle(self, obj):
+        return self._get_dynamic_attr('description', obj)
+
+
+class LatestPostsAtomFeed(AtomMixin, LatestPostsFeed):
+    pass
+
+
+class GroupPostsAtomFeed(AtomMixin, GroupPostsFeed):
+    pass
+
+
+class AuthorPostsAtomFeed(AtomMixin, AuthorPostsFeed):
+    pass
@@ -0,0 +1,15 @@
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+@register.simple_tag
+def prefetch_thumbnails(posts):
+    """Готовит миниатюры страницы до цикла по постам.
+
+    Стоит внутри {% cache %}: при готовом фрагменте не выполняется.
+    """
+    thumbnails.prefetch(posts)
+    return ''
@@ -1,11 +1,13 @@
 import shutil
 import tempfile
 from http import HTTPStatus
+from io import BytesIO
 
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.forms import PostForm, CommentForm
 from posts.models import Group, Post, User, Comment
@@ -105,10 +107,54 @@ class PostFormTests(TestCase):
         self.assertEqual(post.text, form_data['text'])
         self.assertEqual(post.group.id, form_data['group'])
         self.assertEqual(post.author, self.user_author)
-        self.assertEqual(post.image, self.post.image)
+        self.assertEqual(post.image.name, 'posts/small.gif')
+        self.assertFalse(post.thumbnail_ready)
         self.assertRedirects(response, self.PROFILE)
         self.assertEqual(response.status_code, HTTPStatus.FOUND)
 
+    def upload_png(self, width, height, name='large.png'):
+        image = BytesIO()
+        Image.new('RGB', (width, height), 'white').save(image, 'PNG')
+        return self.author_client.post(CREATE_POST, {
+            'text': 'Большая картинка',
+            'image': SimpleUploadedFile(
+                name, image.getvalue(), content_type='image/png'),
+        })
+
+    @override_settings(POSTS_IMAGE_MAX_PIXELS=2000)
+    def test_large_image_downscaled(self):
+        """Оригинал больше бюджета точек сохраняется уменьшенным."""
+        self.upload_png(200, 100)
+        post = Post.objects.get(text='Большая картинка')
+        with Image.open(post.image) as image:
+            self.assertEqual(image.format, 'PNG')
+            self.assertLessEqual(image.width * image.height, 2000)
+            self.assertEqual(image.size, (62, 31))
+
+    @override_settings(POSTS_IMAGE_BOMB_PIXELS=10000)
+    def test_decompression_bomb_rejected(self):
+        """Картинка с огромным разрешением не принимается."""
+        response = self.upload_png(200, 100)
+        self.assertFalse(Post.objects.filter(text='Большая картинка'))
+        self.assertFormError(
+            response, 'form', 'image',
+            'Слишком большое разрешение картинки.'
+        )
+
+    @override_settings(POSTS_IMAGE_DECODE_PIXELS=10000)
+    def test_full_decode_limit_spares_jpeg(self):
+        """Предел полного декодирования не касается JPEG."""
+        self.upload_png(200, 100)
+        self.assertFalse(Post.objects.filter(text='Большая картинка'))
+        image = BytesIO()
+        Image.new('RGB', (200, 100), 'white').save(image, 'JPEG')
+        self.author_client.post(CREATE_POST, {
+            'text': 'Большая картинка',
+            'image': SimpleUploadedFile(
+                'large.jpg', image.getvalue(), content_type='image/jpeg'),
+        })
+        self.assertTrue(Post.objects.filter(text='Большая картинка'))
+
     def test_edit_post(self):
         """Валидная форма редактирует запись в Пост."""
         posts_count = Post.objects.all().count()
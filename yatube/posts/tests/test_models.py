@@ -1,6 +1,22 @@
+import json
+import os
+import re
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.db.models import Count
 from django.test import TestCase
+from django.utils import timezone
+
+from posts.feed import FollowFeed
+from posts.models import (
+    Comment, FeedEntry, Follow, Group, Post, User, UserStats
+)
+from posts.utils import KEYSET, keyset_filter
 
-from posts.models import Group, Post, User
+FULL_SCAN = re.compile(r'\bSCAN (TABLE )?\w+(?! USING)( |$)', re.MULTILINE)
 
 
 class PostModelTest(TestCase):
@@ -26,3 +42,202 @@ class PostModelTest(TestCase):
         expected_object_name_post = post.text[:15]
         self.assertEqual(expected_object_name_group, str(group))
         self.assertEqual(expected_object_name_post, str(post))
+
+
+class UserStatsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def assertStats(self, user, posts, followers, following):
+        stats = UserStats.objects.get(user=user)
+        self.assertEqual(
+            (stats.posts_count, stats.followers_count, stats.following_count),
+            (posts, followers, following)
+        )
+
+    def test_counters_follow_changes(self):
+        """Счётчики меняются при создании и удалении постов и подписок."""
+        post = Post.objects.create(author=self.author, text='Пост')
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertStats(self.author, 1, 1, 0)
+        self.assertStats(self.reader, 0, 0, 1)
+        post.delete()
+        follow.delete()
+        self.assertStats(self.author, 0, 0, 0)
+        self.assertStats(self.reader, 0, 0, 0)
+
+    def test_post_moved_to_another_author(self):
+        """Смена автора поста переносит счётчик и записи лент."""
+        other = User.objects.create_user(username='other')
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.reader, author=self.author)
+        Follow.objects.create(user=fan, author=other)
+        post = Post.objects.create(author=self.author, text='Пост')
+        post.author = other
+        post.save()
+        self.assertStats(self.author, 0, 1, 0)
+        self.assertStats(other, 1, 1, 0)
+        self.assertEqual(
+            list(FeedEntry.objects.filter(post=post).values_list(
+                'user_id', flat=True)),
+            [fan.id]
+        )
+        post.delete()
+        self.assertStats(other, 0, 1, 0)
+
+    def test_repair_user_stats(self):
+        """Команда repair_user_stats исправляет разошедшиеся счётчики."""
+        Post.objects.create(author=self.author, text='Пост')
+        UserStats.objects.filter(user=self.author).update(posts_count=7)
+        UserStats.objects.filter(user=self.reader).delete()
+        call_command('repair_user_stats', stdout=StringIO())
+        self.assertStats(self.author, 1, 0, 0)
+        self.assertStats(self.reader, 0, 0, 0)
+
+
+class SeedCommandTest(TestCase):
+    def test_seed_yatube(self):
+        """seed_yatube создаёт данные и согласованные производные таблицы."""
+        call_command(
+            'seed_yatube', users=30, groups=3, posts=200, comments=100,
+            follows=60, batch_size=50, stdout=StringIO()
+        )
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Post.objects.count(), 200)
+        self.assertEqual(Comment.objects.count(), 100)
+        self.assertEqual(
+            FeedEntry.objects.count(),
+            Follow.objects.filter(author__posts__isnull=False).count()
+        )
+        author = Post.objects.values('author').annotate(
+            total=Count('id')).order_by('-total').first()
+        self.assertEqual(
+            UserStats.objects.get(user=author['author']).posts_count,
+            author['total']
+        )
+        with self.assertRaises(CommandError):
+            call_command('seed_yatube', users=1, stdout=StringIO())
+
+
+class ImportPostsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='cats', description='Описание')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'posts.jsonl')
+
+    def write(self, lines, mode='w'):
+        with open(self.path, mode, encoding='utf-8') as file:
+            file.writelines(f'{line}\n' for line in lines)
+
+    def import_posts(self, **options):
+        call_command('import_posts', self.path, stdout=StringIO(),
+                     stderr=StringIO(), batch_size=2, **options)
+
+    def test_import_jsonl(self):
+        """JSONL: посты, комментарии, группы, ленты и счётчики."""
+        self.write([
+            json.dumps({
+                'author': 'author', 'text': 'Первый', 'group': 'cats',
+                'pub_date': '2020-01-01T10:00:00+00:00',
+                'comments': [{'author': 'reader', 'text': 'Ответ'}],
+            }),
+            '{не json',
+            json.dumps({'author': 'ghost', 'text': 'Без автора'}),
+            json.dumps({'author': 'author', 'text': 'Второй'}),
+        ])
+        self.import_posts()
+        post = Post.objects.get(text='Первый')
+        self.assertEqual(post.group, self.group)
+        self.assertEqual(post.pub_date.year, 2020)
+        self.assertEqual(post.comments.get().author, self.reader)
+        self.assertFalse(Post.objects.filter(text='Без автора').exists())
+        self.assertEqual(
+            FeedEntry.objects.filter(user=self.reader).count(), 2)
+        self.assertEqual(
+            UserStats.objects.get(user=self.author).posts_count, 2)
+
+    def test_resume_from_checkpoint(self):
+        """Повторный запуск продолжает с контрольной точки."""
+        self.write([json.dumps({'author': 'author', 'text': 'Первый'})])
+        self.import_posts()
+        self.write(
+            [json.dumps({'author': 'new', 'text': 'Второй'})], mode='a')
+        self.import_posts(create_authors=True)
+        self.assertEqual(Post.objects.filter(text='Первый').count(), 1)
+        self.assertEqual(
+            Post.objects.get(text='Второй').author.username, 'new')
+        self.import_posts(restart=True)
+        self.assertEqual(Post.objects.filter(text='Первый').count(), 2)
+
+    def test_import_csv(self):
+        """CSV с многострочным текстом в кавычках."""
+        self.path = self.path.replace('.jsonl', '.csv')
+        self.write([
+            'author,text,group',
+            'author,"Строка\nвторая строка",cats',
+            'author,Ещё пост,',
+        ])
+        self.import_posts()
+        self.assertEqual(
+            list(Post.objects.order_by('id').values_list('text', 'group')),
+            [('Строка\nвторая строка', self.group.id), ('Ещё пост', None)]
+        )
+
+
+class FeedIndexesTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа',
+            slug='indexes',
+            description='Описание',
+        )
+        cls.post = Post.objects.create(
+            author=cls.user,
+            text='Пост',
+            group=cls.group
+        )
+
+    def feed_queries(self):
+        now = timezone.now()
+        feeds = {
+            'index': Post.objects.select_related('author', 'group'),
+            'group': Post.objects.filter(
+                group=self.group).select_related('author'),
+            'profile': self.user.posts.select_related('group'),
+        }
+        for name, queryset in feeds.items():
+            yield name, queryset.order_by('-pub_date', '-id')[:11]
+            yield f'{name} cursor', keyset_filter(
+                queryset, KEYSET, now, self.post.id)[:11]
+            yield f'{name} cursor back', keyset_filter(
+                queryset, KEYSET, now, self.post.id, backward=True)[:11]
+        pushed, _, _ = FollowFeed(
+            self.user).seek(now, self.post.id)._streams()
+        yield 'follow', pushed[:11]
+        yield 'comments', Comment.objects.filter(
+            post=self.post).order_by('created')
+        yield 'followers', Follow.objects.filter(
+            author=self.user).values_list('user_id', flat=True)
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент читают индексы без полных сканов и сортировок."""
+        for name, queryset in self.feed_queries():
+            with self.subTest(query=name):
+                plan = queryset.explain()
+                self.assertNotRegex(plan, FULL_SCAN)
+                self.assertNotIn('TEMP B-TREE', plan)
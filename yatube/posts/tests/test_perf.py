@@ -0,0 +1,120 @@
+import json
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.test import LiveServerTestCase, SimpleTestCase, TestCase
+
+from posts import perf
+from posts.models import Group, Post, User
+
+
+class PerfTests(SimpleTestCase):
+    def test_summarize(self):
+        """Перцентили считаются по ближайшему рангу в миллисекундах."""
+        summary = perf.summarize([i / 1000 for i in range(100, 0, -1)], 2)
+        self.assertEqual(summary['count'], 100)
+        self.assertEqual(summary['rps'], 50)
+        self.assertEqual(
+            (summary['p50_ms'], summary['p95_ms'], summary['p99_ms']),
+            (50, 95, 99)
+        )
+
+    def test_compare(self):
+        """Замедлениями считается только рост больше порога."""
+        baseline = {'index': {'p95_ms': 100}, 'profile': {'p95_ms': 100}}
+        current = {
+            'index': {'p95_ms': 125},
+            'profile': {'p95_ms': 105},
+            'post_detail': {'p95_ms': 500},
+        }
+        self.assertEqual(
+            perf.compare(current, baseline, 'p95_ms', 10),
+            [('index', 100, 125, 25.0)]
+        )
+
+
+class LoadTestCommandTests(LiveServerTestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author')
+        group = Group.objects.create(
+            title='Группа', slug='load', description='Описание')
+        Post.objects.create(author=self.user, text='Пост', group=group)
+        User.objects.create_user(username='reader')
+
+    def test_loadtest_reports_percentiles(self):
+        """loadtest пишет JSON с перцентилями по именам URL."""
+        handle, output = tempfile.mkstemp(suffix='.json')
+        os.close(handle)
+        self.addCleanup(os.remove, output)
+        call_command(
+            'loadtest', url=self.live_server_url, requests=40,
+            concurrency=1, output=output, stdout=StringIO()
+        )
+        with open(output, encoding='utf-8') as file:
+            results = json.load(file)
+        self.assertEqual(results['total']['count'], 40)
+        self.assertEqual(results['total']['errors'], 0)
+        for summary in results['urls'].values():
+            self.assertLessEqual(summary['p50_ms'], summary['p99_ms'])
+
+        results['urls'] = {
+            name: dict(summary, p95_ms=summary['p95_ms'] / 100)
+            for name, summary in results['urls'].items()
+        }
+        perf.dump(results, output)
+        with self.assertRaises(CommandError):
+            call_command(
+                'loadtest', url=self.live_server_url, requests=40,
+                concurrency=1, baseline=output, stdout=StringIO()
+            )
+
+
+class BenchmarkViewsCommandTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        call_command(
+            'seed_yatube', users=10, groups=2, posts=60, comments=30,
+            follows=20, stdout=StringIO()
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.results_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.results_dir)
+
+    def benchmark(self, **options):
+        call_command(
+            'benchmark_views', repeat=2, warmup=0,
+            results_dir=self.results_dir, stdout=StringIO(), **options
+        )
+        [name] = os.listdir(self.results_dir)
+        return os.path.join(self.results_dir, name)
+
+    def test_benchmark_views(self):
+        """benchmark_views делит время вью и сохраняет итоги по коммиту."""
+        results = perf.load(self.benchmark())
+        self.assertEqual(
+            set(results['views']),
+            {'index', 'group_posts', 'profile', 'post_detail',
+             'follow_index'}
+        )
+        for result in results['views'].values():
+            self.assertGreater(result['queries'], 0)
+            self.assertGreater(result['orm_ms'], 0)
+            self.assertGreater(result['template_ms'], 0)
+
+    def test_benchmark_views_regression(self):
+        """Замедление сверх порога относительно baseline — ошибка."""
+        path = self.benchmark()
+        results = perf.load(path)
+        for result in results['views'].values():
+            result['total']['p50_ms'] /= 100
+        perf.dump(results, path)
+        with self.assertRaises(CommandError):
+            self.benchmark(baseline=path)
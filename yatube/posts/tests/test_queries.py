@@ -0,0 +1,130 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from posts import urls as posts_urls
+from posts.models import Comment, Follow, Group, Post, User
+from users import urls as users_urls
+
+FEED_ITEMS = 15
+COMMENTS = 12
+ANONYMOUS, AUTHORIZED = 'anonymous', 'authorized'
+
+# Максимум запросов к БД на страницу при холодном кэше:
+# имя URL: (аноним, авторизованный пользователь).
+BUDGETS = {
+    'posts:index': (2, 4),
+    'posts:index_rss': (1, 1),
+    'posts:index_atom': (1, 1),
+    'posts:group_list': (3, 5),
+    'posts:group_export': (4, 5),
+    'posts:group_rss': (2, 2),
+    'posts:group_atom': (2, 2),
+    'posts:profile': (3, 6),
+    'posts:profile_export': (4, 5),
+    'posts:profile_rss': (2, 2),
+    'posts:profile_atom': (2, 2),
+    'posts:post_detail': (2, 4),
+    'posts:post_comments': (1, 3),
+    'posts:post_create': (0, 3),
+    'posts:post_edit': (0, 4),
+    'posts:add_comment': (0, 3),
+    'posts:search': (0, 2),
+    'posts:search_api': (0, 0),
+    'posts:api_posts': (2, 4),
+    'posts:api_post': (1, 3),
+    'posts:api_comments': (1, 3),
+    'posts:api_groups': (1, 1),
+    'posts:api_group_posts': (3, 5),
+    'posts:api_profile_posts': (3, 5),
+    'posts:api_following': (2, 2),
+    'posts:api_followers': (2, 2),
+    'posts:follow_index': (0, 5),
+    'posts:profile_follow': (0, 17),
+    'posts:profile_unfollow': (0, 10),
+    'users:signup': (0, 2),
+    'users:logout': (0, 4),
+    'users:login': (0, 2),
+    'users:password_change': (0, 2),
+    'users:password_change_done': (0, 2),
+    'users:password_reset': (0, 0),
+    'users:password_reset_done': (0, 2),
+    'users:password_reset_complete': (0, 2),
+}
+# Страницы, которые нельзя открыть без параметров из письма.
+SKIPPED = {'users:password_reset_confirm'}
+
+
+class QueryBudgetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='budget-slug',
+            description='Тестовое описание',
+        )
+        for i in range(FEED_ITEMS):
+            writer = User.objects.create_user(username=f'writer{i}')
+            Follow.objects.create(user=cls.reader, author=writer)
+            Post.objects.create(
+                text=f'Пост {i}', author=writer, group=cls.group)
+        cls.post = Post.objects.create(
+            text='Пост автора', author=cls.author, group=cls.group)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.reader, text=f'Коммент {i}')
+            for i in range(COMMENTS)
+        )
+        cls.kwargs = {
+            'slug': cls.group.slug,
+            'username': cls.author.username,
+            'post_id': cls.post.id,
+        }
+
+    def get_client(self, role):
+        client = Client()
+        if role == AUTHORIZED:
+            client.force_login(self.reader)
+        return client
+
+    def budgeted_urls(self):
+        for module in (posts_urls, users_urls):
+            for pattern in module.urlpatterns:
+                name = f'{module.app_name}:{pattern.name}'
+                if name in SKIPPED:
+                    continue
+                kwargs = {
+                    key: self.kwargs[key]
+                    for key in pattern.pattern.converters
+                }
+                yield name, reverse(name, kwargs=kwargs)
+
+    def test_every_url_has_budget(self):
+        """Для каждого URL posts и users объявлен бюджет запросов."""
+        names = {name for name, _ in self.budgeted_urls()}
+        self.assertEqual(names - set(BUDGETS), set())
+
+    def test_query_budgets(self):
+        """Страницы укладываются в бюджет запросов к БД."""
+        for name, url in self.budgeted_urls():
+            for role, budget in zip((ANONYMOUS, AUTHORIZED), BUDGETS[name]):
+                with self.subTest(url=name, role=role):
+                    client = self.get_client(role)
+                    cache.clear()
+                    with CaptureQueriesContext(connection) as queries:
+                        response = client.get(url)
+                        # Потоковый ответ читает БД, пока отдаётся.
+                        if response.streaming:
+                            b''.join(response.streaming_content)
+                    executed = queries.captured_queries
+                    self.assertLessEqual(
+                        len(executed),
+                        budget,
+                        f'{name} ({role}): {len(executed)} запросов '
+                        f'при бюджете {budget}:\n' + '\n'.join(
+                            query['sql'] for query in executed
+                        )
+                    )
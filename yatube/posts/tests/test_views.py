@@ -1,14 +1,29 @@
+import base64
+import json
 import shutil
 import tempfile
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
 from django import forms
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import connection
 from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
 
-from posts.models import Group, Post, User, Follow
+from posts import feed_cache, thumbnails
+from posts.models import Comment, FeedEntry, Group, Post, User, Follow
+from posts.utils import COMMENT_LIMIT, CURSOR_PARAM, explicit_dates
 
 FIRST_POST = 0
 POST_AMOUNT_ON_PAGE = 10
@@ -18,6 +33,25 @@ POST_CREATE = reverse('posts:post_create')
 TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
 
 
+@contextmanager
+def committed():
+    """Выполняет transaction.on_commit изнутри блока, как после COMMIT.
+
+    TestCase держит тест в транзакции, которая не фиксируется, а сброс
+    кэша лент отложен до фиксации (в Django 3.2 для этого появился
+    captureOnCommitCallbacks).
+    """
+    start = len(connection.run_on_commit)
+    try:
+        yield
+    finally:
+        while len(connection.run_on_commit) > start:
+            callbacks = connection.run_on_commit[start:]
+            del connection.run_on_commit[start:]
+            for _, callback in callbacks:
+                callback()
+
+
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class PostPagesTests(TestCase):
     @classmethod
@@ -204,6 +238,52 @@ class PostPagesTests(TestCase):
         posts3 = self.authorized_client.get(INDEX).content
         self.assertFalse(posts1 == posts3)
 
+    def test_profile_and_detail_without_aggregates(self):
+        """Профиль и пост берут счётчики без COUNT-запросов."""
+        for url in (self.PROFILE, self.POST_DETAIL):
+            with self.subTest(url=url):
+                self.authorized_client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.authorized_client.get(url)
+                self.assertEqual(response.context['posts_count'], 1)
+                self.assertFalse(any(
+                    'COUNT(' in query['sql']
+                    for query in queries.captured_queries
+                ))
+
+    def test_feed_cache_invalidated_on_post_change(self):
+        """Изменение поста сразу сбрасывает кэш лент, где он показан."""
+        for url in (INDEX, self.GROUP_LIST, self.PROFILE):
+            with self.subTest(url=url):
+                cache.clear()
+                self.authorized_client.get(url)
+                post = Post.objects.get(pk=self.post.pk)
+                post.text = f'Отредактированный пост {url}'
+                with committed():
+                    post.save()
+                content = self.authorized_client.get(url).content.decode()
+                self.assertIn(post.text, content)
+
+    def test_feed_cache_invalidated_after_commit(self):
+        """Версия ленты меняется только после фиксации транзакции."""
+        before = feed_cache.get_versions(feed_cache.INDEX_FEED)
+        with committed():
+            Post.objects.create(author=self.user, text='Пост в транзакции')
+            self.assertEqual(
+                feed_cache.get_versions(feed_cache.INDEX_FEED), before)
+        self.assertNotEqual(
+            feed_cache.get_versions(feed_cache.INDEX_FEED), before)
+
+    def test_feed_cache_survives_unrelated_post(self):
+        """Пост в другой группе не сбрасывает кэш страницы группы."""
+        cache.clear()
+        before = self.authorized_client.get(self.GROUP_LIST).content
+        Post.objects.filter(pk=self.post.pk).update(
+            text='Изменено в обход сигналов')
+        Post.objects.create(author=self.user, text='Пост без группы')
+        after = self.authorized_client.get(self.GROUP_LIST).content
+        self.assertEqual(before, after)
+
 
 @override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
 class FollowTest(TestCase):
@@ -266,3 +346,1182 @@ class FollowTest(TestCase):
         follow.delete()
         response2 = self.follower_client.get(self.FOLLOW_INDEX)
         self.assertEqual(len(response2.context['page_obj']), 0)
+
+    def test_new_post_fanned_out_to_followers(self):
+        """Новый пост автора записывается в ленты его подписчиков."""
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_following
+        )
+        post = Post.objects.create(
+            author=self.user_following,
+            text='Новый пост'
+        )
+        self.assertTrue(
+            FeedEntry.objects.filter(
+                user=self.user_follower, post=post).exists()
+        )
+        response = self.follower_client.get(self.FOLLOW_INDEX)
+        self.assertEqual(response.context['page_obj'][0], post)
+        self.assertFalse(
+            FeedEntry.objects.filter(user=self.user_following).exists()
+        )
+
+    @override_settings(POSTS_CELEBRITY_FOLLOWERS=2)
+    def test_celebrity_posts_pulled_on_read(self):
+        """Посты знаменитостей читаются при показе и сливаются с лентой."""
+        ordinary = User.objects.create_user(username='ordinary')
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=fan, author=self.user_following)
+        cache.clear()
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_following
+        )
+        Follow.objects.create(user=self.user_follower, author=ordinary)
+        ordinary_post = Post.objects.create(author=ordinary, text='Обычный')
+        celebrity_post = Post.objects.create(
+            author=self.user_following,
+            text='Знаменитость'
+        )
+        self.assertFalse(
+            FeedEntry.objects.filter(post=celebrity_post).exists()
+        )
+        page_obj = self.follower_client.get(
+            self.FOLLOW_INDEX).context['page_obj']
+        self.assertEqual(
+            list(page_obj), [celebrity_post, ordinary_post, self.post]
+        )
+        self.assertEqual(page_obj.paginator.count, 3)
+
+    @override_settings(POSTS_CELEBRITY_FOLLOWERS=2)
+    def test_follow_page_sliced_in_sql(self):
+        """Страница ленты подписок режется в SQL, а не в Python."""
+        ordinary = User.objects.create_user(username='ordinary')
+        fan = User.objects.create_user(username='fan')
+        Follow.objects.create(user=self.user_follower, author=ordinary)
+        authors = [ordinary]
+        for celebrities in (False, True):
+            with self.subTest(celebrities=celebrities):
+                if celebrities:
+                    Follow.objects.create(
+                        user=fan, author=self.user_following)
+                    Follow.objects.create(
+                        user=self.user_follower, author=self.user_following)
+                    authors.append(self.user_following)
+                for i in range(POST_AMOUNT_ON_PAGE + 3):
+                    Post.objects.create(author=authors[-1], text=f'Пост {i}')
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    page_obj = self.follower_client.get(
+                        self.FOLLOW_INDEX, {'page': 2}).context['page_obj']
+                expected = Post.objects.filter(
+                    author__in=authors).order_by('-pub_date', '-id')
+                self.assertEqual(
+                    list(page_obj),
+                    list(expected[POST_AMOUNT_ON_PAGE:2 * POST_AMOUNT_ON_PAGE])
+                )
+                self.assertTrue(any(
+                    'OFFSET' in query['sql']
+                    for query in queries.captured_queries
+                ))
+
+    @override_settings(
+        POSTS_CELEBRITY_FOLLOWERS=3, POSTS_CELEBRITY_FOLLOWERS_DOWN=2)
+    def test_former_celebrity_posts_backfilled(self):
+        """Ушедший из знаменитостей автор остаётся в лентах подписчиков."""
+        fans = [
+            User.objects.create_user(username=f'fan{i}') for i in range(2)
+        ]
+        cache.clear()
+        with committed():
+            for fan in fans:
+                Follow.objects.create(user=fan, author=self.user_following)
+            Follow.objects.create(
+                user=self.user_follower, author=self.user_following)
+        post = Post.objects.create(
+            author=self.user_following, text='Пост знаменитости')
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        # Между порогами автор остаётся знаменитостью, а отписка
+        # ничего не раскладывает.
+        with committed():
+            Follow.objects.get(user=fans[0]).delete()
+            call_command('demote_celebrities', stdout=StringIO())
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        with committed():
+            Follow.objects.get(user=fans[1]).delete()
+        self.assertFalse(FeedEntry.objects.filter(post=post).exists())
+        page_obj = self.follower_client.get(
+            self.FOLLOW_INDEX).context['page_obj']
+        self.assertEqual(list(page_obj), [post, self.post])
+        with committed():
+            call_command('demote_celebrities', stdout=StringIO())
+        self.assertEqual(
+            set(FeedEntry.objects.filter(
+                user=self.user_follower).values_list('post_id', flat=True)),
+            {post.id, self.post.id}
+        )
+        page_obj = self.follower_client.get(
+            self.FOLLOW_INDEX).context['page_obj']
+        self.assertEqual(list(page_obj), [post, self.post])
+
+    def test_follow_feed_cache_is_per_user(self):
+        """Кэш ленты подписок не показывает чужие подписки."""
+        cache.clear()
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_following
+        )
+        follower_page = self.follower_client.get(self.FOLLOW_INDEX)
+        self.assertContains(follower_page, self.post.text)
+        following_page = self.following_client.get(self.FOLLOW_INDEX)
+        self.assertNotContains(following_page, self.post.text)
+
+    def test_follow_feed_cache_invalidated(self):
+        """Новый пост и отписка сразу видны в ленте подписок."""
+        cache.clear()
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_following
+        )
+        self.follower_client.get(self.FOLLOW_INDEX)
+        with committed():
+            post = Post.objects.create(
+                author=self.user_following,
+                text='Свежий пост автора'
+            )
+        response = self.follower_client.get(self.FOLLOW_INDEX)
+        self.assertContains(response, post.text)
+        with committed():
+            self.follower_client.get(self.UNFOLLOW)
+        response = self.follower_client.get(self.FOLLOW_INDEX)
+        self.assertNotContains(response, post.text)
+
+    def test_rebuild_follow_feed(self):
+        """Команда rebuild_follow_feed восстанавливает ленты по Follow."""
+        Follow.objects.create(
+            user=self.user_follower,
+            author=self.user_following
+        )
+        FeedEntry.objects.all().delete()
+        call_command('rebuild_follow_feed', stdout=StringIO())
+        self.assertEqual(
+            list(FeedEntry.objects.values_list('user', 'post')),
+            [(self.user_follower.id, self.post.id)]
+        )
+
+
+class PaginatorViewsTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='paginator')
+        cls.group = Group.objects.create(
+            title='Тестовая группа',
+            slug='paginator-slug',
+            description='Тестовое описание'
+        )
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.user, group=cls.group)
+            for i in range(POST_AMOUNT_ON_PAGE + 3)
+        )
+        cls.GROUP_LIST = reverse(
+            'posts:group_list',
+            kwargs={'slug': cls.group.slug}
+        )
+        cls.PROFILE = reverse(
+            'posts:profile',
+            kwargs={'username': cls.user}
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_warm_fragment_skips_page_query(self):
+        """При тёплом кэше фрагмента посты страницы не читаются."""
+        for url in (INDEX, self.GROUP_LIST, self.PROFILE):
+            with self.subTest(url=url):
+                self.client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(url)
+                self.assertContains(response, '?cursor=')
+                self.assertFalse(any(
+                    'FROM "posts_post"' in query['sql']
+                    for query in queries.captured_queries
+                ))
+
+    def test_page_number_still_works(self):
+        """Старые ссылки ?page=N продолжают работать."""
+        for url in (INDEX, self.GROUP_LIST, self.PROFILE):
+            with self.subTest(url=url):
+                first = self.client.get(url).context['page_obj']
+                second = self.client.get(url + '?page=2').context['page_obj']
+                self.assertEqual(len(first), POST_AMOUNT_ON_PAGE)
+                self.assertEqual(len(second), 3)
+
+    def test_cursor_pages(self):
+        """Курсоры ведут на следующую и обратно на предыдущую страницу."""
+        for url in (INDEX, self.GROUP_LIST, self.PROFILE):
+            with self.subTest(url=url):
+                first = self.client.get(url).context['page_obj']
+                # Курсор ленивый: в ссылку он попадает строкой.
+                second = self.client.get(
+                    url, {'cursor': str(first.next_cursor)}
+                ).context['page_obj']
+                self.assertEqual(len(second), 3)
+                self.assertFalse(second.has_next())
+                self.assertNotIn(second[0], list(first))
+                back = self.client.get(
+                    url, {'cursor': str(second.previous_cursor)}
+                ).context['page_obj']
+                self.assertEqual(list(back), list(first))
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        response = self.client.get(INDEX, {'cursor': 'испорчен'})
+        self.assertEqual(
+            len(response.context['page_obj']), POST_AMOUNT_ON_PAGE
+        )
+
+    def test_cursor_id_out_of_range_returns_first_page(self):
+        """Курсор с id вне BIGINT открывает первую страницу, а не 500."""
+        paginator = self.client.get(INDEX).context['page_obj'].paginator
+        for pk in (10 ** 20, 0, -1, True):
+            with self.subTest(pk=pk):
+                payload = json.dumps([timezone.now().isoformat(), pk, False])
+                token = base64.urlsafe_b64encode(payload.encode()).decode()
+                self.assertIsNone(paginator.decode_cursor(token))
+                response = self.client.get(INDEX, {'cursor': token})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(
+                    len(response.context['page_obj']), POST_AMOUNT_ON_PAGE)
+
+    def test_count_comes_from_feed_counter(self):
+        """Общее число постов берётся из счётчика и сдвигается сигналами."""
+        self.client.get(INDEX)
+        with CaptureQueriesContext(connection) as queries:
+            paginator = self.client.get(INDEX).context['page_obj'].paginator
+            self.assertEqual(paginator.count, POST_AMOUNT_ON_PAGE + 3)
+        self.assertFalse(
+            any('COUNT(' in query['sql'] for query in queries.captured_queries)
+        )
+        with committed():
+            post = Post.objects.create(text='Ещё пост', author=self.user)
+        paginator = self.client.get(INDEX).context['page_obj'].paginator
+        self.assertEqual(paginator.count, POST_AMOUNT_ON_PAGE + 4)
+        with committed():
+            post.delete()
+        paginator = self.client.get(INDEX).context['page_obj'].paginator
+        self.assertEqual(paginator.count, POST_AMOUNT_ON_PAGE + 3)
+
+    @override_settings(POSTS_ESTIMATED_COUNT=True)
+    @mock.patch('posts.utils.ESTIMATE_LIMIT', POST_AMOUNT_ON_PAGE)
+    def test_estimated_count(self):
+        """Оценочный режим считает не больше ESTIMATE_LIMIT постов."""
+        paginator = self.client.get(
+            self.GROUP_LIST).context['page_obj'].paginator
+        self.assertEqual(paginator.count, POST_AMOUNT_ON_PAGE)
+
+    @mock.patch('posts.utils.ESTIMATE_LIMIT', POST_AMOUNT_ON_PAGE)
+    def test_pages_past_estimate(self):
+        """Страницы за оценкой открываются, а не обрезаются по ней."""
+        with override_settings(POSTS_ESTIMATED_COUNT=True):
+            self.client.get(self.GROUP_LIST)
+            page_obj = self.client.get(
+                self.GROUP_LIST, {'page': 2}).context['page_obj']
+            self.assertEqual(page_obj.number, 2)
+            self.assertEqual(len(page_obj), 3)
+            self.assertFalse(page_obj.has_next())
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(self.GROUP_LIST, {'page': 2})
+            self.assertFalse(any(
+                'COUNT(' in query['sql']
+                for query in queries.captured_queries
+            ))
+            page_obj = self.client.get(
+                self.GROUP_LIST, {'page': 5}).context['page_obj']
+            self.assertEqual(page_obj.number, 2)
+            with CaptureQueriesContext(connection) as queries:
+                response = self.client.get(
+                    self.GROUP_LIST, {'page': 10 ** 18})
+            self.assertEqual(response.context['page_obj'].number, 2)
+            self.assertFalse(any(
+                'COUNT(' in query['sql']
+                for query in queries.captured_queries
+            ))
+        paginator = self.client.get(
+            self.GROUP_LIST).context['page_obj'].paginator
+        self.assertEqual(paginator.count, POST_AMOUNT_ON_PAGE + 3)
+
+
+class ExportTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Группа', slug='export', description='Описание')
+        cls.posts = [
+            Post.objects.create(
+                text=f'Пост {i}', author=cls.author, group=cls.group)
+            for i in range(3)
+        ]
+        Comment.objects.create(
+            post=cls.posts[0], author=cls.author, text='Комментарий')
+        cls.url = reverse('posts:profile_export', args=(cls.author,))
+
+    def read(self, response):
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_export_ndjson(self):
+        """NDJSON: посты по возрастанию даты вместе с комментариями."""
+        rows = [
+            json.loads(line)
+            for line in self.read(self.client.get(self.url)).splitlines()
+        ]
+        self.assertEqual(
+            [row['id'] for row in rows], [post.id for post in self.posts])
+        self.assertEqual(rows[0]['comments'][0]['text'], 'Комментарий')
+        self.assertEqual(rows[0]['group'], self.group.slug)
+
+    def test_export_group_csv(self):
+        """CSV выгрузка группы с заголовком."""
+        response = self.client.get(
+            reverse('posts:group_export', args=(self.group.slug,)),
+            {'format': 'csv'}
+        )
+        lines = self.read(response).splitlines()
+        self.assertEqual(lines[0], 'id,author,text,group,pub_date')
+        self.assertEqual(len(lines), 4)
+
+    @override_settings(POSTS_EXPORT_LIMIT=2)
+    def test_export_continues_by_link(self):
+        """Ответ ограничен, продолжение — по ссылке из Link."""
+        response = self.client.get(self.url)
+        self.assertEqual(len(self.read(response).splitlines()), 2)
+        next_url = response['Link'].split(';')[0].strip('<>')
+        response = self.client.get(next_url)
+        [row] = self.read(response).splitlines()
+        self.assertEqual(json.loads(row)['id'], self.posts[2].id)
+        self.assertFalse(response.has_header('Link'))
+
+    def test_export_bad_params(self):
+        """Неизвестный формат, неверные дата и after_id — ошибка 400."""
+        since = self.posts[0].pub_date.isoformat()
+        for params in (
+            {'format': 'xml'}, {'since': 'вчера'},
+            {'since': since, 'after_id': 'x'},
+            {'since': since, 'after_id': str(10 ** 20)},
+        ):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, params)
+                self.assertEqual(response.status_code, 400)
+
+    def test_export_command(self):
+        """Команда export_posts продолжает выгрузку с позиции."""
+        first = self.posts[0]
+        output = StringIO()
+        call_command(
+            'export_posts', author=self.author.username,
+            since=first.pub_date.isoformat(), after_id=first.id,
+            stdout=output
+        )
+        ids = [json.loads(line)['id']
+               for line in output.getvalue().splitlines()]
+        self.assertEqual(ids, [post.id for post in self.posts[1:]])
+
+
+class ConditionalGetTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='conditional', description='Описание')
+        cls.post = Post.objects.create(
+            text='Пост', author=cls.author, group=cls.group)
+        cls.urls = (
+            INDEX,
+            reverse('posts:group_list', args=(cls.group.slug,)),
+            reverse('posts:profile', args=(cls.author.username,)),
+            reverse('posts:post_detail', args=(cls.post.id,)),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.authorized_client = Client()
+        self.authorized_client.force_login(self.reader)
+
+    def test_unchanged_pages_return_304(self):
+        """Неизменённая страница отдаёт 304 без запроса ленты."""
+        for url in self.urls:
+            with self.subTest(url=url):
+                etag = self.client.get(url)['ETag']
+                with CaptureQueriesContext(connection) as queries:
+                    response = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response['ETag'], etag)
+                self.assertLessEqual(len(queries), 1)
+
+    def test_changes_invalidate_validators(self):
+        """Новые посты, комментарии и подписки меняют ETag."""
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        with committed():
+            Post.objects.create(
+                text='Новый пост', author=self.author, group=self.group)
+            Comment.objects.create(
+                post=self.post, author=self.reader, text='Комментарий')
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+        profile = self.urls[2]
+        etag = self.client.get(profile)['ETag']
+        with committed():
+            Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(profile, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_deleted_post_not_modified_no_more(self):
+        """После удаления поста его страницы не отвечают 304."""
+        post = Post.objects.create(text='Удаляемый', author=self.author)
+        urls = (
+            reverse('posts:post_comments', args=(post.id,)),
+            # С автором и группой ответ API идёт без ETag.
+            reverse('posts:api_post', args=(post.id,)) + '?fields=text',
+            reverse('posts:api_comments', args=(post.id,)),
+        )
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        with committed():
+            post.delete()
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 404)
+
+    def test_authorized_pages_are_private(self):
+        """Вариант страницы для пользователя не попадает в общий кэш."""
+        anonymous = self.client.get(INDEX)
+        authorized = self.authorized_client.get(INDEX)
+        self.assertNotEqual(anonymous['ETag'], authorized['ETag'])
+        self.assertIn('private', authorized['Cache-Control'])
+        self.assertNotIn('private', anonymous['Cache-Control'])
+        for response in (anonymous, authorized):
+            self.assertIn('Cookie', response['Vary'])
+        response = self.authorized_client.get(
+            INDEX, HTTP_IF_NONE_MATCH=anonymous['ETag'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_authorized_pages_revalidated(self):
+        """Браузер переспрашивает страницу пользователя каждый раз."""
+        response = self.authorized_client.get(self.urls[3])
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_relogin_changes_etag(self):
+        """После нового входа форма не отдаётся со старым CSRF-токеном."""
+        client = Client()
+        client.force_login(self.reader)
+        url = self.urls[3]
+        # Первый ответ выдаёт CSRF-куку, от неё ETag и зависит.
+        client.get(url)
+        etag = client.get(url)['ETag']
+        self.assertEqual(
+            client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+        client.logout()
+        client.force_login(self.reader)
+        self.assertEqual(
+            client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class SyndicationTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Кошки', slug='cats', description='Про кошек')
+        cls.post = Post.objects.create(
+            text='Пост <про> кошек', author=cls.author, group=cls.group)
+        Post.objects.create(text='Пост без группы', author=cls.author)
+        cls.feeds = {
+            reverse('posts:index_rss'): 2,
+            reverse('posts:index_atom'): 2,
+            reverse('posts:group_rss', args=(cls.group.slug,)): 1,
+            reverse('posts:group_atom', args=(cls.group.slug,)): 1,
+            reverse('posts:profile_rss', args=(cls.author.username,)): 2,
+            reverse('posts:profile_atom', args=(cls.author.username,)): 2,
+        }
+
+    def setUp(self):
+        cache.clear()
+
+    def test_feeds_list_posts(self):
+        """Ленты RSS и Atom содержат посты со ссылками на них."""
+        link = reverse('posts:post_detail', args=(self.post.id,))
+        for url, items in self.feeds.items():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                content = response.content.decode()
+                self.assertIn('xml', response['Content-Type'])
+                self.assertEqual(
+                    content.count('<item>') + content.count('<entry>'),
+                    items)
+                self.assertIn(link, content)
+                self.assertIn('Пост &lt;про&gt; кошек', content)
+
+    def test_rendered_feed_is_cached(self):
+        """Повторный запрос отдаётся из кэша или ответом 304."""
+        for url in self.feeds:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                with CaptureQueriesContext(connection) as queries:
+                    cached = self.client.get(url)
+                    revalidated = self.client.get(
+                        url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(cached.content, response.content)
+                self.assertEqual(revalidated.status_code, 304)
+                self.assertLessEqual(len(queries), 2)
+                self.assertIn('public', response['Cache-Control'])
+
+    def test_new_post_invalidates_feed(self):
+        """Новый пост и правка группы меняют ленты."""
+        url = reverse('posts:group_rss', args=(self.group.slug,))
+        etag = self.client.get(url)['ETag']
+        with committed():
+            Post.objects.create(
+                text='Новый пост', author=self.author, group=self.group)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Новый пост', response.content.decode())
+        self.group.title = 'Коты'
+        with committed():
+            self.group.save()
+        self.assertIn('Коты', self.client.get(url).content.decode())
+
+    def test_rendered_feed_per_host(self):
+        """Готовый XML не отдаётся другому хосту или схеме."""
+        url = reverse('posts:index_rss')
+        self.client.get(url)
+        for host, secure in (('localhost', False), ('127.0.0.1', True)):
+            with self.subTest(host=host, secure=secure):
+                response = self.client.get(
+                    url, HTTP_HOST=host, secure=secure)
+                scheme = 'https' if secure else 'http'
+                self.assertIn(
+                    f'{scheme}://{host}/', response.content.decode())
+                self.assertNotIn('testserver', response.content.decode())
+
+    def test_pages_link_feeds(self):
+        """Страницы лент ссылаются на свои RSS и Atom."""
+        response = self.client.get(
+            reverse('posts:group_list', args=(self.group.slug,)))
+        self.assertContains(
+            response, reverse('posts:group_rss', args=(self.group.slug,)))
+        self.assertContains(
+            response, reverse('posts:group_atom', args=(self.group.slug,)))
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+        cls.cat = Post.objects.create(
+            text='Кошка <b>спит</b> на диване', author=cls.author)
+        cls.cats = Post.objects.create(
+            text='Кошка кошка кошка', author=cls.author)
+        cls.dog = Post.objects.create(text='Собака', author=cls.author)
+
+    def search(self, query, **params):
+        response = self.client.get(
+            reverse('posts:search_api'), {'q': query, **params})
+        return response.json()
+
+    def ids(self, query):
+        return [result['id'] for result in self.search(query)['results']]
+
+    def test_ranked_results_with_snippets(self):
+        """Результаты идут по релевантности, совпадения выделены."""
+        self.assertEqual(self.ids('кошка'), [self.cats.id, self.cat.id])
+        self.assertEqual(self.ids('диван'), [self.cat.id])
+        self.assertEqual(self.ids('кошка OR "собака'), [])
+        self.assertEqual(self.ids('***'), [])
+        snippet = self.search('спит')['results'][0]['snippet']
+        self.assertIn('&lt;b&gt;<mark>спит</mark>&lt;/b&gt;', snippet)
+
+    def test_signals_keep_index_in_sync(self):
+        """Правка и удаление поста сразу видны в поиске."""
+        self.dog.text = 'Кошка вместо собаки'
+        self.dog.save()
+        self.assertIn(self.dog.id, self.ids('кошка'))
+        self.assertEqual(self.ids('собака'), [])
+        self.cat.delete()
+        self.assertNotIn(self.cat.id, self.ids('кошка'))
+
+    def indexed_comments(self):
+        with connection.cursor() as db:
+            db.execute('SELECT rowid FROM posts_comment_fts')
+            return {row[0] for row in db.fetchall()}
+
+    def test_post_delete_cascades_comments_in_one_query(self):
+        """Комментарии поста удаляются одним DELETE и уходят из индекса."""
+        reader = User.objects.create_user(username='reader')
+        post = Post.objects.create(text='Обсуждение', author=self.author)
+        comments = [
+            Comment.objects.create(post=post, author=reader, text='Ответ')
+            for _ in range(30)
+        ]
+        kept = Comment.objects.create(
+            post=self.cat, author=reader, text='Ответ')
+        with CaptureQueriesContext(connection) as queries:
+            post.delete()
+        comment_queries = [
+            query['sql'] for query in queries.captured_queries
+            if '"posts_comment"' in query['sql']
+        ]
+        self.assertEqual(len(comment_queries), 1)
+        self.assertTrue(comment_queries[0].startswith('DELETE'))
+        indexed = self.indexed_comments()
+        self.assertFalse(indexed & {comment.id for comment in comments})
+        self.assertIn(kept.id, indexed)
+        reader.delete()
+        self.assertNotIn(kept.id, self.indexed_comments())
+
+    def test_admin_comment_delete_updates_index(self):
+        """Удалённый в админке комментарий пропадает из индекса."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        first, second, third = (
+            Comment.objects.create(post=self.cat, author=admin, text='Ответ')
+            for _ in range(3)
+        )
+        self.client.post(
+            reverse('admin:posts_comment_delete', args=(first.id,)),
+            {'post': 'yes'}
+        )
+        self.client.post(reverse('admin:posts_comment_changelist'), {
+            'action': 'delete_selected',
+            '_selected_action': [second.id],
+            'post': 'yes',
+        })
+        self.assertEqual(
+            list(Comment.objects.values_list('id', flat=True)), [third.id])
+        self.assertEqual(self.indexed_comments(), {third.id})
+
+    def test_keyset_pagination(self):
+        """Страницы поиска идут по курсору без повторов."""
+        Post.objects.bulk_create(
+            Post(text=f'Кот номер {i}', author=self.author)
+            for i in range(15)
+        )
+        call_command('rebuild_search_index', stdout=StringIO())
+        first = self.search('кот')
+        self.assertEqual(len(first['results']), 10)
+        cursor = first['next'].split('cursor=')[1]
+        second = self.search('кот', cursor=cursor)
+        self.assertIsNone(second['next'])
+        ids = [result['id'] for result in first['results']
+               + second['results']]
+        self.assertEqual(len(set(ids)), 15)
+        response = self.client.get(
+            reverse('posts:search'), {'q': 'кот', 'cursor': 'плохой'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_cursor_out_of_range(self):
+        """Курсор с числами вне BIGINT — ошибка 400, а не 500."""
+        for payload in ([1.0, 10 ** 20], [1.0, True], [10 ** 400, 1]):
+            token = base64.urlsafe_b64encode(
+                json.dumps(payload).encode()).decode()
+            for name in ('posts:search', 'posts:search_api'):
+                with self.subTest(payload=payload, url=name):
+                    response = self.client.get(
+                        reverse(name), {'q': 'кот', 'cursor': token})
+                    self.assertEqual(response.status_code, 400)
+
+    def test_search_page(self):
+        """Страница поиска показывает найденные посты."""
+        response = self.client.get(reverse('posts:search'), {'q': 'диван'})
+        self.assertContains(response, '<mark>диване</mark>')
+        self.assertContains(
+            response, reverse('posts:post_detail', args=(self.cat.id,)))
+
+    def test_admin_search_uses_index(self):
+        """Поиск в админке находит посты через полнотекстовый индекс."""
+        admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'кошка'})
+        self.assertEqual(
+            {post.id for post in response.context['cl'].result_list},
+            {self.cat.id, self.cats.id}
+        )
+
+
+class AdminChangelistTest(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.admin = User.objects.create_superuser(
+            'admin', 'admin@example.com', 'password')
+        cls.group = Group.objects.create(
+            title='Группа', slug='admin-group', description='Описание')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.admin, group=cls.group)
+            for i in range(250)
+        )
+        cls.post = Post.objects.create(
+            text='Кошка на диване', author=cls.admin)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=cls.admin, text=f'Ответ {i}')
+            for i in range(120)
+        )
+        Comment.objects.create(
+            post=cls.post, author=cls.admin, text='Рыжая кошка')
+        cls.urls = {
+            Post: reverse('admin:posts_post_changelist'),
+            Comment: reverse('admin:posts_comment_changelist'),
+        }
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def walk(self, url):
+        """Все строки списка, пройденные по ссылкам «Следующая»."""
+        seen = []
+        while url:
+            response = self.client.get(url)
+            changelist = response.context['cl']
+            seen += [obj.pk for obj in changelist.result_list]
+            url = changelist.next_page_url
+            if url:
+                url = self.urls[changelist.model] + url
+        return seen
+
+    def test_cursor_pages_cover_table(self):
+        """Курсорные страницы проходят всю таблицу без повторов."""
+        for model, url in self.urls.items():
+            with self.subTest(model=model.__name__):
+                seen = self.walk(url)
+                self.assertEqual(len(seen), model.objects.count())
+                self.assertEqual(len(set(seen)), len(seen))
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        """Страница списка — постоянное число запросов без COUNT(*)."""
+        for url in self.urls.values():
+            with self.subTest(url=url):
+                with CaptureQueriesContext(connection) as queries:
+                    self.client.get(url)
+                sql = [query['sql'] for query in queries.captured_queries]
+                self.assertLessEqual(len(sql), 8, '\n'.join(sql))
+                self.assertFalse(any('COUNT(' in query for query in sql))
+
+    def test_sorted_changelist_uses_pages(self):
+        """С сортировкой по колонке работают обычные страницы."""
+        response = self.client.get(
+            self.urls[Post], {'o': '2', 'p': '1'})
+        changelist = response.context['cl']
+        self.assertFalse(changelist.cursor_paging)
+        self.assertEqual(changelist.result_count, Post.objects.count())
+        self.assertEqual(len(changelist.result_list), 100)
+
+    def test_comment_search_uses_index(self):
+        """Поиск комментариев идёт по полнотекстовому индексу."""
+        response = self.client.get(self.urls[Comment], {'q': 'кошка'})
+        self.assertEqual(
+            [comment.text for comment in response.context['cl'].result_list],
+            ['Рыжая кошка']
+        )
+
+    def test_list_editable_saves_cursor_page(self):
+        """Правка групп прямо в списке работает на курсорной странице."""
+        formset = self.client.get(self.urls[Post]).context['cl'].formset
+        data = {
+            'form-TOTAL_FORMS': formset.total_form_count(),
+            'form-INITIAL_FORMS': formset.initial_form_count(),
+            '_save': 'Сохранить',
+        }
+        for index, form in enumerate(formset):
+            data[f'form-{index}-id'] = form.instance.id
+            data[f'form-{index}-group'] = ''
+        response = self.client.post(self.urls[Post], data)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            Post.objects.filter(group__isnull=True).count(), 100)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ThumbnailQueueTest(TestCase):
+    small_gif = (
+        b'\x47\x49\x46\x38\x39\x61\x02\x00'
+        b'\x01\x00\x80\x00\x00\x00\x00\x00'
+        b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+        b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+        b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+        b'\x0A\x00\x3B'
+    )
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def upload(self, name='queued.gif'):
+        self.client.post(POST_CREATE, {
+            'text': 'Пост с картинкой',
+            'image': SimpleUploadedFile(
+                name, self.small_gif, content_type='image/gif'),
+        })
+        return Post.objects.get(text='Пост с картинкой')
+
+    def test_placeholder_until_worker_runs(self):
+        """До обработки очереди лента показывает заглушку."""
+        post = self.upload()
+        self.assertFalse(post.thumbnail_ready)
+        response = self.client.get(INDEX)
+        self.assertContains(response, 'aspect-ratio')
+        self.assertNotContains(response, '<img class="card-img')
+        etag = response['ETag']
+
+        with committed():
+            call_command('generate_thumbnails', stdout=StringIO())
+        post.refresh_from_db()
+        self.assertTrue(post.thumbnail_ready)
+        response = self.client.get(INDEX, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, '<img class="card-img')
+        self.assertNotContains(response, 'aspect-ratio')
+
+    def test_replaced_image_stays_queued(self):
+        """Картинку заменили во время обработки — пост ждёт новую."""
+        post = self.upload()
+        stale = Post.objects.get(id=post.id)
+        post.image = SimpleUploadedFile(
+            'replaced.gif', self.small_gif, content_type='image/gif')
+        post.save()
+        self.assertEqual(thumbnails.mark_ready([stale]), [])
+        self.assertEqual(thumbnails.pending(10), [post])
+
+    def test_page_reads_thumbnail_metadata_in_batch(self):
+        """Страница берёт метаданные миниатюр из кэша, а не из sorl."""
+        post = self.upload()
+        call_command('generate_thumbnails', stdout=StringIO())
+        response = self.client.get(INDEX)
+        thumbnail = response.context['page_obj'][0].thumbnail
+        thumbnails._lru.clear()
+        feed_cache.bump_versions([feed_cache.INDEX_FEED])
+        with mock.patch('posts.thumbnails.get_thumbnail') as get_thumbnail:
+            for url in (INDEX, reverse('posts:post_detail', args=(post.id,))):
+                with self.subTest(url=url):
+                    self.assertContains(
+                        self.client.get(url),
+                        f'src="{thumbnail["url"]}" '
+                        f'width="{thumbnail["width"]}"'
+                    )
+        get_thumbnail.assert_not_called()
+
+    def test_page_does_not_build_thumbnails(self):
+        """Без метаданных в кэше лента не строит миниатюры сама."""
+        post = self.upload()
+        Post.objects.filter(id=post.id).update(thumbnail_ready=True)
+        post.refresh_from_db()
+        with mock.patch('posts.thumbnails.get_thumbnail') as get_thumbnail:
+            thumbnails.prefetch([post])
+        get_thumbnail.assert_not_called()
+        self.assertIsNone(post.thumbnail)
+
+    def test_responsive_variants(self):
+        """Worker строит варианты по ширинам, лента отдаёт их в srcset."""
+        image = BytesIO()
+        Image.new('RGB', (1600, 600), 'white').save(image, 'PNG')
+        self.client.post(POST_CREATE, {
+            'text': 'Большая картинка',
+            'image': SimpleUploadedFile(
+                'large.png', image.getvalue(), content_type='image/png'),
+        })
+        call_command('generate_thumbnails', stdout=StringIO())
+        response = self.client.get(INDEX)
+        thumbnail = response.context['page_obj'][0].thumbnail
+        widths = [
+            int(candidate.rsplit(' ', 1)[1].rstrip('w'))
+            for candidate in thumbnail['srcset'].split(', ')
+        ]
+        self.assertEqual(widths, list(settings.POSTS_IMAGE_WIDTHS))
+        self.assertEqual(
+            thumbnail['type'],
+            thumbnails.MIME_TYPES[thumbnails.variant_format()]
+        )
+        self.assertContains(response, f'srcset="{thumbnail["srcset"]}"')
+
+    def test_small_image_variants_not_upscaled(self):
+        """Картинка меньше всех ширин даёт один вариант своего размера."""
+        post = self.upload()
+        self.assertEqual(len(thumbnails.variants(post.image.name)), 1)
+
+    def test_broken_images_do_not_break_feed(self):
+        """Битая и пропавшая картинки не роняют ленту и не кэшируются."""
+        # Форма битый файл не пропустит, поэтому он кладётся в хранилище
+        # напрямую, как картинка, испорченная уже после загрузки.
+        Post.objects.create(
+            text='Битая картинка', author=self.author,
+            image=default_storage.save(
+                'posts/broken.jpg', ContentFile(b'\xff\xd8\xff' * 10))
+        )
+        Post.objects.create(
+            text='Пропавшая картинка', author=self.author,
+            image='posts/missing.jpg'
+        )
+        call_command('generate_thumbnails', stdout=StringIO(),
+                     stderr=StringIO())
+        response = self.client.get(INDEX)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['page_obj']), 2)
+        for post in response.context['page_obj']:
+            with self.subTest(post=post.text):
+                self.assertTrue(post.thumbnail_ready)
+                self.assertIsNone(post.thumbnail)
+                self.assertIsNone(cache.get(
+                    thumbnails._metadata_key(post.image.name)))
+
+
+class CommentPaginationTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(username='commenter')
+        cls.post = Post.objects.create(text='Популярный пост', author=cls.user)
+        start = timezone.now()
+        # По три комментария на одну дату: порядок внутри даты по id.
+        with explicit_dates(Comment._meta.get_field('created')):
+            Comment.objects.bulk_create(
+                Comment(
+                    post=cls.post, author=cls.user, text=f'Коммент {i}',
+                    created=start + timedelta(minutes=i // 3)
+                )
+                for i in range(COMMENT_LIMIT + 5)
+            )
+        cls.POST_DETAIL = reverse('posts:post_detail', args=(cls.post.id,))
+        cls.POST_COMMENTS = reverse(
+            'posts:post_comments', args=(cls.post.id,))
+
+    def setUp(self):
+        cache.clear()
+
+    def texts(self, comments):
+        return [comment.text for comment in comments]
+
+    def test_first_page_is_limited(self):
+        """Пост показывает только первую страницу старых комментариев."""
+        comments = self.client.get(self.POST_DETAIL).context['comments']
+        self.assertEqual(
+            self.texts(comments),
+            [f'Коммент {i}' for i in range(COMMENT_LIMIT)]
+        )
+        self.assertTrue(comments.has_next())
+
+    def test_fragment_continues_from_cursor(self):
+        """Фрагмент по курсору отдаёт следующие комментарии без повторов."""
+        cursor = self.client.get(
+            self.POST_DETAIL).context['comments'].next_cursor
+        response = self.client.get(
+            self.POST_COMMENTS, {CURSOR_PARAM: cursor})
+        self.assertTemplateUsed(
+            response, 'posts/includes/comment_list.html')
+        self.assertTemplateNotUsed(response, 'base.html')
+        self.assertEqual(
+            self.texts(response.context['comments']),
+            [f'Коммент {i}' for i in range(COMMENT_LIMIT, COMMENT_LIMIT + 5)]
+        )
+        self.assertNotContains(response, 'data-fragment')
+
+    def test_fragment_for_missing_post(self):
+        """Фрагмент для несуществующего поста — 404."""
+        response = self.client.get(
+            reverse('posts:post_comments', args=(self.post.id + 1,)))
+        self.assertEqual(response.status_code, 404)
+
+
+class PostHeaderCacheTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='header')
+        cls.group = Group.objects.create(
+            title='Группа шапки', slug='header-slug', description='-')
+        cls.post = Post.objects.create(
+            text='Исходный текст', author=cls.author, group=cls.group)
+        cls.POST_DETAIL = reverse('posts:post_detail', args=(cls.post.id,))
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.author)
+
+    def test_header_rendered_from_cache(self):
+        """Шапка берётся из кэша, пока версии поста не сдвинулись."""
+        self.client.get(self.POST_DETAIL)
+        # update() не шлёт сигналов: версии и кэш шапки прежние.
+        Post.objects.filter(id=self.post.id).update(text='Тихая правка')
+        self.assertContains(self.client.get(self.POST_DETAIL), 'Исходный')
+
+    def test_header_invalidated(self):
+        """Комментарий, правка поста и группы сбрасывают шапку."""
+        changes = (
+            ('comment', lambda: self.client.post(
+                reverse('posts:add_comment', args=(self.post.id,)),
+                {'text': 'Комментарий'})),
+            ('post edit', lambda: self.client.post(
+                reverse('posts:post_edit', args=(self.post.id,)),
+                {'text': 'post edit', 'group': self.group.id})),
+            ('group edit', lambda: Group.objects.filter(
+                id=self.group.id).get().save()),
+        )
+        for name, change in changes:
+            with self.subTest(change=name):
+                self.client.get(self.POST_DETAIL)
+                Post.objects.filter(id=self.post.id).update(text=name)
+                change()
+                self.assertContains(self.client.get(self.POST_DETAIL), name)
+
+
+class ApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='api-author')
+        cls.reader = User.objects.create_user(username='api-reader')
+        cls.group = Group.objects.create(
+            title='Группа API', slug='api-slug', description='-')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=cls.author, group=cls.group)
+            for i in range(POST_AMOUNT_ON_PAGE + 3)
+        )
+        cls.post = Post.objects.latest('id')
+        Comment.objects.create(
+            post=cls.post, author=cls.reader, text='Комментарий API')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.API_POSTS = reverse('posts:api_posts')
+        cls.API_POST = reverse('posts:api_post', args=(cls.post.id,))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_cursor_pages(self):
+        """Лента API листается курсором без повторов и пропусков."""
+        ids, url = [], self.API_POSTS
+        while url:
+            data = self.client.get(url).json()
+            ids += [post['id'] for post in data['results']]
+            url = data['next']
+        self.assertEqual(
+            ids,
+            list(Post.objects.order_by('-pub_date', '-id')
+                 .values_list('id', flat=True))
+        )
+
+    def test_sparse_fields(self):
+        """?fields= сужает и ответ, и SELECT."""
+        with CaptureQueriesContext(connection) as queries:
+            data = self.client.get(
+                self.API_POSTS, {'fields': 'author'}).json()
+        self.assertEqual(
+            data['results'][0], {'id': self.post.id, 'author': 'api-author'})
+        sql = ' '.join(query['sql'] for query in queries.captured_queries)
+        self.assertNotIn('"posts_post"."text"', sql)
+        self.assertNotIn('posts_group', sql)
+
+    def test_unknown_field(self):
+        """Неизвестное поле — ошибка 400, а не молчаливый пропуск."""
+        response = self.client.get(self.API_POSTS, {'fields': 'password'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_serialization_cached_per_post_version(self):
+        """Собственные поля поста берутся из кэша до правки поста."""
+        fields = {'fields': 'text,pub_date,image'}
+        self.client.get(self.API_POST, fields)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(
+                self.client.get(self.API_POST, fields).json()['text'],
+                self.post.text
+            )
+        self.assertEqual(len(queries.captured_queries), 0)
+        self.post.text = 'Правка'
+        with committed():
+            self.post.save()
+        self.assertEqual(
+            self.client.get(self.API_POST, fields).json()['text'], 'Правка')
+
+    def test_author_and_group_not_stale(self):
+        """Переименование автора и удаление группы видны сразу."""
+        for url in (self.API_POSTS, self.API_POST):
+            self.client.get(url)
+        User.objects.filter(id=self.author.id).update(username='renamed')
+        Group.objects.filter(id=self.group.id).delete()
+        for url in (self.API_POSTS, self.API_POST):
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                post = data['results'][0] if 'results' in data else data
+                self.assertEqual(post['author'], 'renamed')
+                self.assertIsNone(post['group'])
+                self.assertEqual(post['text'], self.post.text)
+
+    def test_related_fields_not_revalidated(self):
+        """С автором и группой ответ идёт без ETag и не отдаёт 304."""
+        own = {'fields': 'text'}
+        for url in (self.API_POSTS, self.API_POST):
+            with self.subTest(url=url):
+                etag = self.client.get(url, own)['ETag']
+                self.assertEqual(self.client.get(
+                    url, own, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+                response = self.client.get(
+                    url, {'fields': 'author'}, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+                self.assertFalse(response.has_header('ETag'))
+
+    def test_group_and_profile_feeds(self):
+        """Ленты группы и автора отдают первую страницу и курсор."""
+        for url in (
+            reverse('posts:api_group_posts', args=(self.group.slug,)),
+            reverse('posts:api_profile_posts', args=(self.author.username,)),
+        ):
+            with self.subTest(url=url):
+                data = self.client.get(url).json()
+                self.assertEqual(len(data['results']), POST_AMOUNT_ON_PAGE)
+                self.assertIsNotNone(data['next'])
+
+    def test_comments_groups_follows(self):
+        """Комментарии, группы и подписки отдаются с выбранными полями."""
+        cases = (
+            (reverse('posts:api_comments', args=(self.post.id,)),
+             {'text': 'Комментарий API', 'author': 'api-reader'}),
+            (reverse('posts:api_groups'), {'slug': 'api-slug'}),
+            (reverse('posts:api_following', args=('api-reader',)),
+             {'author': 'api-author'}),
+            (reverse('posts:api_followers', args=('api-author',)),
+             {'user': 'api-reader'}),
+        )
+        for url, expected in cases:
+            with self.subTest(url=url):
+                results = self.client.get(
+                    url, {'fields': ','.join(expected)}).json()['results']
+                self.assertEqual(len(results), 1)
+                self.assertEqual(
+                    {key: results[0][key] for key in expected}, expected)
+
+    def test_follow_cursor_must_be_ascii_number(self):
+        """Курсор подписок из «²» или чужих цифр — ошибка 400, а не 500."""
+        url = reverse('posts:api_followers', args=('api-author',))
+        for cursor in ('²', '٣', '-1', str(10 ** 20)):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(url, {CURSOR_PARAM: cursor})
+                self.assertEqual(response.status_code, 400)
@@ -0,0 +1,154 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from PIL import features
+from sorl.thumbnail import get_thumbnail
+
+from . import feed, feed_cache
+from .models import Post
+
+# Те же параметры, что у {% thumbnail %} в includes/post_image.html:
+# иначе шаблон не найдёт готовую миниатюру и построит её сам.
+WIDTH, HEIGHT = 960, 339
+GEOMETRY = f'{WIDTH}x{HEIGHT}'
+OPTIONS = {'crop': 'center', 'upscale': True}
+METADATA_KEY = 'posts:thumbnail:{digest}'
+# Ширина колонки ленты: больше неё браузеру качать нечего.
+SIZES = '(max-width: 1200px) 100vw, 1110px'
+MIME_TYPES = {'WEBP': 'image/webp', 'JPEG': 'image/jpeg'}
+LRU_SIZE = 1000
+
+# Метаданные миниатюр по имени картинки. Имя новой картинки всегда
+# новое, поэтому записи не устаревают и LRU можно не сбрасывать.
+_lru = OrderedDict()
+_lru_lock = threading.Lock()
+
+
+def pending(limit):
+    """Посты с картинками, которые ждут миниатюр, в порядке загрузки."""
+    return list(
+        Post.objects.filter(thumbnail_ready=False)
+        .only('id', 'image', 'author_id', 'group_id')
+        .order_by('id')[:limit]
+    )
+
+
+def variant_format():
+    """Формат вариантов из настроек, если Pillow умеет в него писать."""
+    if settings.POSTS_IMAGE_FORMAT == 'WEBP' and not features.check('webp'):
+        return 'JPEG'
+    return settings.POSTS_IMAGE_FORMAT
+
+
+def variants(name):
+    """Варианты картинки по ширинам POSTS_IMAGE_WIDTHS, от меньшей.
+
+    Пропорции те же, что у основной миниатюры. Маленькая картинка
+    не растягивается, так что одинаковые варианты схлопываются.
+    """
+    built = {}
+    for width in settings.POSTS_IMAGE_WIDTHS:
+        height = round(width * HEIGHT / WIDTH)
+        thumbnail = get_thumbnail(
+            name, f'{width}x{height}', crop='center', upscale=False,
+            format=variant_format(), quality=settings.POSTS_IMAGE_QUALITY
+        )
+        built.setdefault(thumbnail.width, thumbnail)
+    return [built[width] for width in sorted(built)]
+
+
+def generate(post):
+    """Строит миниатюру с вариантами и кладёт их метаданные в кэш."""
+    metadata = describe(post.image.name)
+    cache.set(_metadata_key(post.image.name), metadata, None)
+    return metadata
+
+
+def describe(name):
+    """Метаданные для шаблона: основная миниатюра и srcset вариантов.
+
+    Строит недостающие миниатюры, поэтому зовётся только из worker.
+    """
+    thumbnail = get_thumbnail(name, GEOMETRY, **OPTIONS)
+    return {
+        'url': thumbnail.url,
+        'width': thumbnail.width,
+        'height': thumbnail.height,
+        'srcset': ', '.join(
+            f'{variant.url} {variant.width}w' for variant in variants(name)
+        ),
+        'type': MIME_TYPES[variant_format()],
+        'sizes': SIZES,
+    }
+
+
+def _metadata_key(name):
+    options = (
+        GEOMETRY, settings.POSTS_IMAGE_WIDTHS, variant_format(),
+        settings.POSTS_IMAGE_QUALITY, name
+    )
+    digest = hashlib.md5(repr(options).encode()).hexdigest()
+    return METADATA_KEY.format(digest=digest)
+
+
+def _remember(found):
+    with _lru_lock:
+        _lru.update(found)
+        for name in found:
+            _lru.move_to_end(name)
+        while len(_lru) > LRU_SIZE:
+            _lru.popitem(last=False)
+
+
+def prefetch(posts):
+    """Метаданные миниатюр всех постов страницы разом.
+
+    Каждому посту ставится атрибут thumbnail: словарь из generate()
+    или None, если картинки нет, миниатюра ещё в очереди или её
+    метаданных нет в кэше (битая картинка, вытеснение). Сначала
+    смотрится LRU процесса, затем один get_many к кэшу; миниатюры
+    здесь не строятся — это дело worker.
+    """
+    posts = list(posts)
+    names = {
+        post.image.name for post in posts
+        if post.image and post.thumbnail_ready
+    }
+    with _lru_lock:
+        found = {name: _lru[name] for name in names if name in _lru}
+    missing = {_metadata_key(name): name for name in names - set(found)}
+    if missing:
+        cached = {
+            missing[key]: value
+            for key, value in cache.get_many(list(missing)).items()
+        }
+        found.update(cached)
+    _remember(found)
+    for post in posts:
+        post.thumbnail = found.get(post.image.name) if post.image else None
+    return posts
+
+
+def mark_ready(posts):
+    """Снимает посты с очереди и сбрасывает кэш лент, где была заглушка.
+
+    Пост, картинку которого успели заменить, остаётся в очереди.
+    """
+    ready = []
+    with transaction.atomic():
+        for post in posts:
+            if Post.objects.filter(
+                id=post.id, image=post.image.name, thumbnail_ready=False
+            ).update(thumbnail_ready=True):
+                ready.append(post)
+    feeds = set()
+    for post in ready:
+        feeds.update(feed_cache.post_feeds(post))
+        feeds.add(feed_cache.post_feed(post.id))
+        feeds.update(feed.follower_feeds(post))
+    feed_cache.after_commit(feed_cache.bump_versions, feeds)
+    return ready
@@ -1,6 +1,6 @@
 from django.urls import path
 
-from . import views
+from . import api, syndication, views
 
 app_name = 'posts'
 
@@ -10,21 +10,66 @@ urlpatterns = [
         views.index,
         name='index'
     ),
+    path(
+        'rss/',
+        syndication.LatestPostsFeed(),
+        name='index_rss'
+    ),
+    path(
+        'atom/',
+        syndication.LatestPostsAtomFeed(),
+        name='index_atom'
+    ),
     path(
         'group/<slug:slug>/',
         views.group_posts,
         name='group_list'
     ),
+    path(
+        'group/<slug:slug>/export/',
+        views.group_export,
+        name='group_export'
+    ),
+    path(
+        'group/<slug:slug>/rss/',
+        syndication.GroupPostsFeed(),
+        name='group_rss'
+    ),
+    path(
+        'group/<slug:slug>/atom/',
+        syndication.GroupPostsAtomFeed(),
+        name='group_atom'
+    ),
     path(
         'profile/<str:username>/',
         views.profile,
         name='profile'
     ),
+    path(
+        'profile/<str:username>/export/',
+        views.profile_export,
+        name='profile_export'
+    ),
+    path(
+        'profile/<str:username>/rss/',
+        syndication.AuthorPostsFeed(),
+        name='profile_rss'
+    ),
+    path(
+        'profile/<str:username>/atom/',
+        syndication.AuthorPostsAtomFeed(),
+        name='profile_atom'
+    ),
     path(
         'posts/<int:post_id>/',
         views.post_detail,
         name='post_detail'
     ),
+    path(
+        'posts/<int:post_id>/comments/',
+        views.post_comments,
+        name='post_comments'
+    ),
     path(
         'create/',
         views.post_create,
@@ -40,6 +85,56 @@ urlpatterns = [
         views.add_comment,
         name='add_comment'
     ),
+    path(
+        'search/',
+        views.post_search,
+        name='search'
+    ),
+    path(
+        'search/api/',
+        views.post_search_api,
+        name='search_api'
+    ),
+    path(
+        f'api/{api.VERSION}/posts/',
+        api.post_list,
+        name='api_posts'
+    ),
+    path(
+        f'api/{api.VERSION}/posts/<int:post_id>/',
+        api.post_item,
+        name='api_post'
+    ),
+    path(
+        f'api/{api.VERSION}/posts/<int:post_id>/comments/',
+        api.comment_list,
+        name='api_comments'
+    ),
+    path(
+        f'api/{api.VERSION}/groups/',
+        api.group_list,
+        name='api_groups'
+    ),
+    path(
+        f'api/{api.VERSION}/groups/<slug:slug>/posts/',
+        api.group_post_list,
+        name='api_group_posts'
+    ),
+    path(
+        f'api/{api.VERSION}/profiles/<str:username>/posts/',
+        api.profile_post_list,
+        name='api_profile_posts'
+    ),
+    path(
+        f'api/{api.VERSION}/profiles/<str:username>/following/',
+        api.following_list,
+        name='api_following'
+    ),
+    path(
+        f'api/{api.VERSION}/profiles/<str:username>/followers/',
+        api.follower_list,
+        name='api_followers'
+    ),
     path(
         'follow/',
         views.follow_index,
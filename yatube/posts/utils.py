@@ -1,10 +1,277 @@
-from django.core.paginator import Paginator
+import base64
+import binascii
+import json
+from contextlib import contextmanager
+from itertools import islice
+
+from django.conf import settings
+from django.core.paginator import EmptyPage, Page, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property, lazy
+
+from . import feed_cache
 
 POST_LIMIT = 10
+COMMENT_LIMIT = 20
+ESTIMATE_LIMIT = 100 * POST_LIMIT
+# Глубже этого страницы по номеру за оценкой не досчитываются:
+# дальше листают курсором.
+DEEP_COUNT_LIMIT = 100 * ESTIMATE_LIMIT
+CURSOR_PARAM = 'cursor'
+# id в курсоре должен поместиться в BIGINT, иначе SQLite не примет его.
+MAX_CURSOR_PK = 2 ** 63 - 1
+KEYSET = ('pub_date', 'id')
+COMMENT_KEYSET = ('created', 'id')
+
+
+def batched(items, size):
+    """Разбивает итерируемое на списки не длиннее size."""
+    items = iter(items)
+    batch = list(islice(items, size))
+    while batch:
+        yield batch
+        batch = list(islice(items, size))
+
+
+@contextmanager
+def explicit_dates(*fields):
+    """Позволяет bulk_create сохранить заданные даты вместо auto_now_add."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def keyset_filter(queryset, keys, date, pk, backward=False):
+    """Записи строго после позиции (date, pk) в порядке убывания.
+
+    С backward=True — записи перед позицией, по возрастанию.
+    """
+    date_key, id_key = keys
+    lookup = 'gt' if backward else 'lt'
+    # Нестрогое условие по дате даёт планировщику диапазон индекса,
+    # строгое OR уточняет позицию внутри одной даты.
+    queryset = queryset.filter(
+        Q(**{f'{date_key}__{lookup}e': date}),
+        Q(**{f'{date_key}__{lookup}': date})
+        | Q(**{f'{id_key}__{lookup}': pk})
+    )
+    if backward:
+        return queryset.order_by(date_key, id_key)
+    return queryset.order_by(f'-{date_key}', f'-{id_key}')
+
+
+class CursorPage(Page):
+    """Страница ленты, полученная по курсору, без номера и COUNT(*)."""
+
+    def __init__(self, object_list, paginator, next_cursor=None,
+                 previous_cursor=None):
+        super().__init__(object_list, None, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу (pub_date, id).
+
+    Обычные страницы ?page=N работают как раньше, а ?cursor=<токен>
+    читает следующую порцию по индексу, без OFFSET, с одинаковой
+    стоимостью на любой глубине.
+    """
+
+    def __init__(self, object_list, per_page, keys=KEYSET, **kwargs):
+        self.keys = keys
+        super().__init__(self._order(object_list), per_page, **kwargs)
+
+    def encode_cursor(self, obj, backward=False):
+        date_key, id_key = self.keys
+        # Строки values() приходят словарями.
+        if isinstance(obj, dict):
+            date, pk = obj[date_key], obj[id_key]
+        else:
+            date, pk = getattr(obj, date_key), getattr(obj, id_key)
+        payload = [date.isoformat(), pk, backward]
+        token = base64.urlsafe_b64encode(json.dumps(payload).encode())
+        return token.decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        """Возвращает (дата, id, назад) или None для неверного токена."""
+        try:
+            padded = token + '=' * (-len(token) % 4)
+            date, pk, backward = json.loads(
+                base64.urlsafe_b64decode(padded.encode()))
+            date = parse_datetime(date)
+        except (binascii.Error, TypeError, ValueError):
+            return None
+        if date is None or type(pk) is not int:
+            return None
+        if not 0 < pk <= MAX_CURSOR_PK:
+            return None
+        return date, pk, bool(backward)
+
+    def _get_page(self, *args, **kwargs):
+        page = super()._get_page(*args, **kwargs)
+        # Курсоры считаются при выводе: пока они не нужны (фрагмент
+        # страницы взят из кэша), строки страницы не читаются.
+        page.next_cursor = lazy(
+            lambda: self.encode_cursor(page[-1]), str
+        )() if page.has_next() else None
+        page.previous_cursor = lazy(
+            lambda: self.encode_cursor(page[0], backward=True), str
+        )() if page.has_previous() else None
+        return page
+
+    def get_cursor_page(self, token):
+        """Страница после (или перед) записью, закодированной в токене."""
+        position = self.decode_cursor(token) if token else None
+        if position is None:
+            return self._cursor_page(self.object_list, False, False)
+        backward = position[2]
+        return self._cursor_page(self._seek(*position), True, backward)
+
+    def _order(self, object_list):
+        return object_list.order_by(*(f'-{key}' for key in self.keys))
+
+    def _seek(self, date, pk, backward):
+        return keyset_filter(self.object_list, self.keys, date, pk, backward)
+
+    def _cursor_page(self, queryset, from_cursor, backward):
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if backward:
+            if not has_more:
+                # Дошли до начала ленты: отдаём обычную первую страницу.
+                return self._cursor_page(self.object_list, False, False)
+            rows.reverse()
+        has_next = backward or has_more
+        has_previous = from_cursor
+        return CursorPage(
+            rows,
+            self,
+            next_cursor=(
+                self.encode_cursor(rows[-1]) if has_next and rows else None
+            ),
+            previous_cursor=(
+                self.encode_cursor(rows[0], backward=True)
+                if has_previous and rows else None
+            ),
+        )
+
+
+class CommentPaginator(CursorPaginator):
+    """Комментарии поста от старых к новым по ключу (created, id).
+
+    Листается только курсором: страница читается по индексу
+    (post, created), в SQLite он заканчивается id, и стоит одинаково
+    при любом числе комментариев.
+    """
+
+    def __init__(self, object_list, per_page=COMMENT_LIMIT, **kwargs):
+        super().__init__(object_list, per_page, keys=COMMENT_KEYSET, **kwargs)
+
+    def _order(self, object_list):
+        return object_list.order_by(*self.keys)
+
+    def _seek(self, date, pk, backward):
+        # keyset_filter листает убывающий список, у комментариев
+        # порядок обратный.
+        return keyset_filter(
+            self.object_list, self.keys, date, pk, not backward)
+
+
+class CachedCountPaginator(CursorPaginator):
+    """Пагинатор, который берёт общее число постов из счётчика ленты.
+
+    Счётчики лежат в кэше и сдвигаются сигналами при создании и
+    удалении постов. В режиме estimated при промахе кэша считается
+    не больше ESTIMATE_LIMIT строк, так что таблица целиком не читается,
+    а страницы за оценкой досчитываются по запросу.
+    """
+
+    def __init__(self, object_list, per_page, feed, estimated=False,
+                 **kwargs):
+        self.feed = feed
+        self.estimated = estimated
+        super().__init__(object_list, per_page, **kwargs)
+
+    @cached_property
+    def count(self):
+        if self.estimated:
+            return feed_cache.get_count(
+                self.feed,
+                lambda: self.object_list[:ESTIMATE_LIMIT].count(),
+                estimated=True
+            )
+        return feed_cache.get_count(self.feed, self.object_list.count)
+
+    def validate_number(self, number):
+        try:
+            return super().validate_number(number)
+        except EmptyPage:
+            if not self.estimated or self.count < ESTIMATE_LIMIT:
+                raise
+            depth = int(number) * self.per_page + 1
+            if depth > DEEP_COUNT_LIMIT:
+                raise
+        # Оценка обрезана ESTIMATE_LIMIT, и страница может лежать за ней:
+        # посты досчитываются до её конца и ещё одного, чтобы знать,
+        # есть ли следующая. Итог становится новой оценкой ленты.
+        self.__dict__['count'] = self.object_list[:depth].count()
+        self.__dict__.pop('num_pages', None)
+        feed_cache.set_count(self.feed, self.count, estimated=True)
+        return super().validate_number(number)
+
+    def page(self, number):
+        # Счётчик может немного отставать, поэтому срез страницы
+        # не обрезается по count.
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self)
+
+
+class FollowFeedPaginator(CachedCountPaginator):
+    """Пагинатор гибридной ленты подписок (posts.feed.FollowFeed)."""
+
+    def _order(self, object_list):
+        return object_list
+
+    def _seek(self, date, pk, backward):
+        return self.object_list.seek(date, pk, backward)
+
+    @cached_property
+    def count(self):
+        return self.object_list.count()
 
 
-def paginate_posts(posts, request):
-    paginator = Paginator(posts, POST_LIMIT)
+def paginate_posts(posts, request, feed=None,
+                   paginator_class=CachedCountPaginator):
+    if feed is None:
+        paginator = CursorPaginator(posts, POST_LIMIT)
+    else:
+        paginator = paginator_class(
+            posts,
+            POST_LIMIT,
+            feed,
+            estimated=getattr(settings, 'POSTS_ESTIMATED_COUNT', False)
+        )
+    cursor = request.GET.get(CURSOR_PARAM)
+    if cursor is not None:
+        return paginator.get_cursor_page(cursor)
     page_number = request.GET.get('page')
     page_obj = paginator.get_page(page_number)
     return page_obj
@@ -1,41 +1,75 @@
+from urllib.parse import urlencode
+
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
+from django.db import transaction
+from django.http import (
+    Http404, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+)
 from django.shortcuts import get_object_or_404, redirect, render
+from django.urls import reverse
+from django.utils.dateparse import parse_datetime
 
+from . import export, feed, feed_cache, search, stats, thumbnails
+from .conditional import conditional_page, not_modified
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
-from .utils import paginate_posts
+from .models import Comment, Group, Post, User, Follow
+from .utils import (
+    CURSOR_PARAM, MAX_CURSOR_PK, CommentPaginator, FollowFeedPaginator,
+    paginate_posts
+)
 
 
+@conditional_page
 def index(request):
+    response = not_modified(request, feed_cache.INDEX_FEED)
+    if response is not None:
+        return response
     posts = Post.objects.select_related(
         'author', 'group').order_by('-pub_date')
     template = 'posts/index.html'
-    page_obj = paginate_posts(posts, request)
+    page_obj = paginate_posts(posts, request, feed_cache.INDEX_FEED)
     context = {
         'page_obj': page_obj,
+        **feed_cache.fragment_context(feed_cache.INDEX_FEED),
     }
     return render(request, template, context)
 
 
+@conditional_page
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
+    response = not_modified(request, feed_cache.group_feed(group.id))
+    if response is not None:
+        return response
     template = 'posts/group_list.html'
     posts = Post.objects.filter(group=group).order_by(
         '-pub_date').select_related('author')
-    page_obj = paginate_posts(posts, request)
+    page_obj = paginate_posts(
+        posts, request, feed_cache.group_feed(group.id))
     context = {
         'group': group,
         'page_obj': page_obj,
+        **feed_cache.fragment_context(feed_cache.group_feed(group.id)),
     }
     return render(request, template, context)
 
 
+@conditional_page
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
+    author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    response = not_modified(
+        request,
+        feed_cache.profile_feed(author.id),
+        feed_cache.counters_feed(author.id),
+    )
+    if response is not None:
+        return response
     posts = author.posts.select_related('group')
-    post_list = Post.objects.filter(author=author)
-    posts_count = post_list.count()
-    page_obj = paginate_posts(posts, request)
+    author_stats = stats.for_user(author)
+    page_obj = paginate_posts(
+        posts, request, feed_cache.profile_feed(author.id))
     following = (
         request.user.is_authenticated and Follow.objects.filter(
             user=request.user, author=author).exists()
@@ -44,33 +78,68 @@ def profile(request, username):
         'author': author,
         'page_obj': page_obj,
         'following': following,
-        'posts_count': posts_count
+        'posts_count': author_stats.posts_count,
+        'author_stats': author_stats,
+        **feed_cache.fragment_context(feed_cache.profile_feed(author.id)),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@conditional_page
 def post_detail(request, post_id):
     form = CommentForm(request.POST or None)
-    post = get_object_or_404(Post, id=post_id)
-    posts_count = post.author.posts.all().count()
-    comments = post.comments.all().select_related('author')
+    # Шапка — один запрос: автор со счётчиками и группа через JOIN.
+    post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), id=post_id)
+    header_feeds = [
+        feed_cache.post_feed(post.id),
+        feed_cache.profile_feed(post.author_id),
+    ]
+    if post.group_id:
+        header_feeds.append(feed_cache.group_feed(post.group_id))
+    response = not_modified(request, *header_feeds)
+    if response is not None:
+        return response
+    posts_count = stats.for_user(post.author).posts_count
+    thumbnails.prefetch([post])
+    comments = CommentPaginator(
+        Comment.objects.filter(post_id=post.id).select_related('author')
+    ).get_cursor_page(request.GET.get(CURSOR_PARAM))
     context = {
         'form': form,
         'post': post,
         'comments': comments,
-        'posts_count': posts_count
+        'posts_count': posts_count,
+        **feed_cache.fragment_context(*header_feeds),
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@conditional_page
+def post_comments(request, post_id):
+    """Следующая страница комментариев поста HTML-фрагментом."""
+    response = not_modified(request, feed_cache.post_feed(post_id))
+    if response is not None:
+        return response
+    comments = CommentPaginator(
+        Comment.objects.filter(post_id=post_id).select_related('author')
+    ).get_cursor_page(request.GET.get(CURSOR_PARAM))
+    # Пост проверяется, только если комментариев нет.
+    if not comments and not Post.objects.filter(id=post_id).exists():
+        raise Http404
+    context = {'post_id': post_id, 'comments': comments}
+    return render(request, 'posts/includes/comment_list.html', context)
+
+
 @login_required
 def post_create(request):
-    form = PostForm(request.POST or None)
+    form = PostForm(request.POST or None, files=request.FILES or None)
     groups = Group.objects.all()
     if form.is_valid():
         post = form.save(commit=False)
         post.author = request.user
-        post.save()
+        with transaction.atomic():
+            post.save()
         return redirect('posts:profile', request.user)
     context = {
         'form': form,
@@ -115,12 +184,17 @@ def add_comment(request, post_id):
 @login_required
 def follow_index(request):
     template = 'posts/follow.html'
-    post_list = Post.objects.filter(
-        author__following__user=request.user).select_related('group')
-    page_obj = paginate_posts(post_list, request)
+    follow_feed = feed.FollowFeed(request.user)
+    page_obj = paginate_posts(
+        follow_feed,
+        request,
+        feed_cache.follow_feed(request.user.id),
+        paginator_class=FollowFeedPaginator
+    )
     context = {
         'page_obj': page_obj,
-        'follow': True
+        'follow': True,
+        **feed_cache.fragment_context(*follow_feed.cache_feeds()),
     }
     return render(request, template, context)
 
@@ -130,7 +204,8 @@ def profile_follow(request, username):
     """Подписаться на автора."""
     author = get_object_or_404(User, username=username)
     if request.user != author:
-        Follow.objects.get_or_create(user=request.user, author=author)
+        with transaction.atomic():
+            Follow.objects.get_or_create(user=request.user, author=author)
     return redirect('posts:profile', username=username)
 
 
@@ -138,5 +213,102 @@ def profile_follow(request, username):
 def profile_unfollow(request, username):
     """Отписаться от автора."""
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    with transaction.atomic():
+        Follow.objects.filter(user=request.user, author=author).delete()
     return redirect('posts:profile', username=username)
+
+
+def export_posts(request, filename, **filters):
+    """Потоковая выгрузка постов в NDJSON или CSV.
+
+    За один ответ отдаётся не больше POSTS_EXPORT_LIMIT постов, чтобы
+    не занимать воркер надолго; продолжение — по ссылке из заголовка
+    Link с позицией (since, after_id) последнего поста.
+    """
+    file_format = request.GET.get('format', 'ndjson')
+    if file_format not in export.FORMATS:
+        return HttpResponseBadRequest('Неизвестный формат выгрузки.')
+    since = request.GET.get('since')
+    if since is not None:
+        since = parse_datetime(since)
+        if since is None:
+            return HttpResponseBadRequest('Неверная дата since.')
+    try:
+        after_id = int(request.GET.get('after_id', 0))
+    except ValueError:
+        after_id = -1
+    if not 0 <= after_id <= MAX_CURSOR_PK:
+        return HttpResponseBadRequest('Неверный after_id.')
+    posts = export.posts_for(since=since, after_id=after_id, **filters)
+    limit = settings.POSTS_EXPORT_LIMIT
+    response = StreamingHttpResponse(
+        export.serialize(posts[:limit], file_format),
+        content_type=export.FORMATS[file_format]
+    )
+    response['Content-Disposition'] = (
+        f'attachment; filename="{filename}.{file_format}"')
+    last = export.boundary(posts, limit)
+    if last is not None:
+        query = urlencode({
+            'format': file_format,
+            'since': last[0].isoformat(),
+            'after_id': last[1],
+        })
+        response['Link'] = (
+            f'<{request.build_absolute_uri(request.path)}?{query}>; '
+            'rel="next"'
+        )
+    return response
+
+
+def profile_export(request, username):
+    author = get_object_or_404(User, username=username)
+    return export_posts(request, author.username, author=author)
+
+
+def group_export(request, slug):
+    group = get_object_or_404(Group, slug=slug)
+    return export_posts(request, group.slug, group=group)
+
+
+def post_search(request):
+    """Поиск по тексту постов с подсветкой совпадений."""
+    query = request.GET.get('q', '').strip()
+    try:
+        posts, next_cursor = search.search(query, request.GET.get('cursor'))
+    except ValueError as error:
+        return HttpResponseBadRequest(str(error))
+    context = {
+        'query': query,
+        'posts': posts,
+        'next_cursor': next_cursor,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def post_search_api(request):
+    """Тот же поиск в JSON; next — ссылка на следующую страницу."""
+    query = request.GET.get('q', '').strip()
+    try:
+        posts, next_cursor = search.search(query, request.GET.get('cursor'))
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    next_url = None
+    if next_cursor is not None:
+        next_url = request.build_absolute_uri(
+            f'{request.path}?{urlencode({"q": query, "cursor": next_cursor})}'
+        )
+    results = [
+        {
+            'id': post.id,
+            'url': request.build_absolute_uri(
+                reverse('posts:post_detail', args=(post.id,))),
+            'author': post.author.username,
+            'group': post.group.slug if post.group else None,
+            'pub_date': post.pub_date.isoformat(),
+            'snippet': post.snippet,
+        }
+        for post in posts
+    ]
+    return JsonResponse({'query': query, 'results': results,
+                         'next': next_url})
@@ -171,3 +171,59 @@ LOGIN_REDIRECT_URL = 'posts:index'
 # Ошибка 403, если при отправке формы не был отправлен csrf-токен
 
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
+
+# Оценочный подсчёт постов в пагинаторе лент: без полного COUNT(*)
+
+POSTS_ESTIMATED_COUNT = False
+
+# Число подписчиков, начиная с которого посты автора не раскладываются
+# по лентам подписок, а читаются при показе (None — раскладывать всегда)
+
+POSTS_CELEBRITY_FOLLOWERS = 10000
+
+# Ниже этого числа подписчиков автор перестаёт быть знаменитостью
+# (команда demote_celebrities). Зазор с POSTS_CELEBRITY_FOLLOWERS не
+# даёт статусу переключаться туда и обратно на каждой подписке
+
+POSTS_CELEBRITY_FOLLOWERS_DOWN = 9000
+
+# Время жизни закэшированных фрагментов лент. Свежесть обеспечивают
+# версии лент, которые сдвигаются при изменении постов. Версии живут в
+# том же кэше: в LocMemCache у каждого процесса они свои, и правка,
+# сделанная в одном воркере, не видна остальным, поэтому с локальным
+# кэшем фрагменты живут недолго. Долгий срок — только с общим кэшем
+# (memcached, redis), одним на все процессы
+
+POSTS_FEED_CACHE_TIMEOUT = (
+    20 if CACHES['default']['BACKEND'].endswith('.LocMemCache')
+    else 60 * 60 * 24
+)
+
+# Сколько постов отдаёт один ответ потоковой выгрузки; продолжение
+# запрашивается по ссылке из заголовка Link
+
+POSTS_EXPORT_LIMIT = 10000
+
+# Ширины адаптивных вариантов картинки поста (srcset), их формат
+# и качество сжатия. Без поддержки WebP в Pillow варианты будут JPEG
+
+POSTS_IMAGE_WIDTHS = (480, 960, 1440)
+POSTS_IMAGE_FORMAT = 'WEBP'
+POSTS_IMAGE_QUALITY = 80
+
+# Загрузки картинок: больше POSTS_IMAGE_MAX_BYTES не принимаются,
+# разрешение больше POSTS_IMAGE_BOMB_PIXELS отклоняется без декодирования,
+# оригиналы больше POSTS_IMAGE_MAX_PIXELS уменьшаются при сохранении.
+# JPEG при этом декодируется сразу уменьшенным, а остальные форматы —
+# целиком, поэтому для них предел POSTS_IMAGE_DECODE_PIXELS (кадр RGBA
+# такого разрешения — около 100 МБ). Файлы загрузок пишутся сразу
+# на диск, а не в память
+
+POSTS_IMAGE_MAX_BYTES = 20 * 1024 * 1024
+POSTS_IMAGE_BOMB_PIXELS = 100_000_000
+POSTS_IMAGE_DECODE_PIXELS = 25_000_000
+POSTS_IMAGE_MAX_PIXELS = 12_000_000
+
+FILE_UPLOAD_HANDLERS = [
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]